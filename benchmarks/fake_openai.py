@@ -0,0 +1,336 @@
+"""Local stand-in for the OpenAI API, for offline benchmarks.
+
+Serves the Responses API (used by the Agents SDK) and Chat Completions, both
+plain and streamed, with a configurable time to first token, output token
+rate, injected errors and an optional requests-per-minute limit. Point the
+client at it with OPENAI_BASE_URL:
+
+    python benchmarks/fake_openai.py --port 8765 --latency 0.2 --tokens-per-second 80
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake prompt-cli batch ...
+
+Only the standard library is used, so the server adds no dependencies.
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Canned Midjourney-style answer; every variation is numbered like a real one
+VARIATION_TEXT = ("A cinematic wide shot of {subject}, lit by a low golden sun, drifting haze and long shadows, "
+                  "rendered with rich film grain and muted teal and amber tones --ar 16:9 --s 250 --v 6.1")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for usage numbers."""
+    return max(1, len(text) // 4)
+
+
+def make_output(question: str, variations: int) -> str:
+    subject = question.strip()[:80] or "an empty stage"
+    lines = [f"Here are {variations} prompts for \"{subject}\":", ""]
+    for number in range(1, variations + 1):
+        lines.append(f"{number}. {VARIATION_TEXT.format(subject=subject)}")
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def request_text(body: dict) -> tuple[str, str]:
+    """(system prompt, user input) from a Responses or Chat Completions request body."""
+    if "messages" in body:
+        messages = body["messages"]
+    else:
+        items = body.get("input") or []
+        messages = [{"role": "user", "content": items}] if isinstance(items, str) else items
+    system = [body.get("instructions") or ""]
+    user = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        (system if message.get("role") in ("system", "developer") else user).append(content)
+    return "\n".join(system).strip(), "\n".join(user).strip()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded fake API server; use as a context manager to run it in the background."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.02,
+                 tokens_per_second: float = 2000.0, variations: int = 5, error_rate: float = 0.0,
+                 error_status: int = 429, retry_after: float | None = None, seed: int = 0,
+                 rpm_limit: int | None = None):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.variations = variations
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        # Like the real API: a continuously refilled bucket, 429 with Retry-After when empty
+        self.rpm_limit = rpm_limit
+        self._allowance = float(rpm_limit or 0)
+        self._allowance_at = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.service_times: list[float] = []
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return fail
+
+    def take_request(self) -> float | None:
+        """Count a request against the RPM limit; None if allowed, else seconds until it would be."""
+        if not self.rpm_limit:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rpm_limit, self._allowance + (now - self._allowance_at) * self.rpm_limit / 60)
+            self._allowance_at = now
+            if self._allowance >= 1:
+                self._allowance -= 1
+                return None
+            self.requests += 1
+            self.rate_limited += 1
+            return (1 - self._allowance) * 60 / self.rpm_limit
+
+    def rate_limit_headers(self) -> dict:
+        if not self.rpm_limit:
+            return {}
+        return {"x-ratelimit-limit-requests": str(self.rpm_limit),
+                "x-ratelimit-remaining-requests": str(int(self._allowance))}
+
+    def record(self, elapsed: float):
+        with self._lock:
+            self.service_times.append(elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            times = list(self.service_times)
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "median_service_ms": round(statistics.median(times) * 1000, 2) if times else None,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = self.errors = self.rate_limited = 0
+            self.service_times = []
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    server: FakeOpenAIServer
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def do_POST(self):
+        started = time.perf_counter()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        path = self.path.rstrip("/")
+        if path.endswith("/responses"):
+            kind = "responses"
+        elif path.endswith("/chat/completions"):
+            kind = "chat"
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "invalid_request_error"}})
+            return
+
+        wait = self.server.take_request()
+        if wait is not None:
+            self._send_json(429, {"error": {"message": "Rate limit reached for requests", "type": "requests",
+                                            "code": "rate_limit_exceeded"}},
+                            {"Retry-After": f"{wait:.3f}", **self.server.rate_limit_headers()})
+            return
+
+        if self.server.should_fail():
+            time.sleep(self.server.latency)
+            headers = {"Retry-After": str(self.server.retry_after)} if self.server.retry_after is not None else {}
+            self._send_json(self.server.error_status, {"error": {"message": "Injected error from fake server",
+                                                                 "type": "fake_error", "code": None}}, headers)
+            return
+
+        system, user = request_text(body)
+        output = make_output(user, self.server.variations)
+        usage = (estimate_tokens(system) + estimate_tokens(user), estimate_tokens(output))
+        model = body.get("model", "gpt-4o-mini")
+        time.sleep(self.server.latency)
+        if body.get("stream"):
+            self._stream(kind, model, output, usage)
+        else:
+            time.sleep(usage[1] / self.server.tokens_per_second)
+            build = self._response if kind == "responses" else self._chat_completion
+            self._send_json(200, build(model, output, usage), self.server.rate_limit_headers())
+        self.server.record(time.perf_counter() - started)
+
+    # --- Payloads ---
+
+    @staticmethod
+    def _response(model: str, output: str, usage: tuple[int, int], status: str = "completed") -> dict:
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": status,
+            "model": model,
+            "output": [{
+                "type": "message",
+                "id": "msg_fake",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": output, "annotations": []}],
+            }] if output else [],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": usage[0],
+                "output_tokens": usage[1],
+                "total_tokens": usage[0] + usage[1],
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens_details": {"reasoning_tokens": 0},
+            },
+        }
+
+    @staticmethod
+    def _chat_completion(model: str, output: str, usage: tuple[int, int]) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": output}}],
+            "usage": {"prompt_tokens": usage[0], "completion_tokens": usage[1],
+                      "total_tokens": usage[0] + usage[1]},
+        }
+
+    def _stream_events(self, kind: str, model: str, output: str, usage: tuple[int, int]):
+        """Yield (payload, seconds to wait before sending it) for a streamed response."""
+        words = output.split(" ")
+        deltas = [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+        delay = lambda text: estimate_tokens(text) / self.server.tokens_per_second
+        if kind == "chat":
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+            chunk = lambda delta, finish=None: {"id": chunk_id, "object": "chat.completion.chunk",
+                                                "created": int(time.time()), "model": model,
+                                                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            yield chunk({"role": "assistant", "content": ""}), 0
+            for delta in deltas:
+                yield chunk({"content": delta}), delay(delta)
+            yield chunk({}, "stop"), 0
+            return
+
+        response = self._response(model, "", usage, status="in_progress")
+        item = {"type": "message", "id": "msg_fake", "status": "in_progress", "role": "assistant", "content": []}
+        part = {"type": "output_text", "text": "", "annotations": []}
+        where = {"item_id": "msg_fake", "output_index": 0, "content_index": 0}
+        events = [
+            ({"type": "response.created", "response": response}, 0),
+            ({"type": "response.output_item.added", "output_index": 0, "item": item}, 0),
+            ({"type": "response.content_part.added", **where, "part": part}, 0),
+        ]
+        events += [({"type": "response.output_text.delta", **where, "delta": delta, "logprobs": []}, delay(delta))
+                    for delta in deltas]
+        done_part = {**part, "text": output}
+        events += [
+            ({"type": "response.output_text.done", **where, "text": output, "logprobs": []}, 0),
+            ({"type": "response.content_part.done", **where, "part": done_part}, 0),
+            ({"type": "response.output_item.done", "output_index": 0,
+              "item": {**item, "status": "completed", "content": [done_part]}}, 0),
+            ({"type": "response.completed", "response": self._response(model, output, usage)}, 0),
+        ]
+        for sequence_number, (event, wait) in enumerate(events):
+            yield {**event, "sequence_number": sequence_number}, wait
+
+    # --- Transport ---
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, kind: str, model: str, output: str, usage: tuple[int, int]):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in self.server.rate_limit_headers().items():
+            self.send_header(name, value)
+        self.end_headers()
+        for payload, wait in self._stream_events(kind, model, output, usage):
+            if wait:
+                time.sleep(wait)
+            prefix = f"event: {payload['type']}\n" if kind == "responses" else ""
+            self._write_chunk(f"{prefix}data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        if kind == "chat":
+            self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI API server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0, help="Output token rate")
+    parser.add_argument("--variations", type=int, default=5, help="Numbered variations per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of injected errors")
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with injected errors")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for error injection")
+    parser.add_argument("--rpm-limit", type=int, help="Requests per minute before answering 429")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.tokens_per_second, args.variations,
+                              args.error_rate, args.error_status, args.retry_after, args.seed, args.rpm_limit)
+    print(f"Fake OpenAI API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Startup benchmark for prompt-cli.
+
+Measures import time of the entry point with `python -X importtime` and checks
+that history-only code paths never load the model stack. Exits non-zero when a
+scenario exceeds its budget, so it can guard against startup regressions:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --json
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported before they are needed
+HEAVY_MODULES = ["openai", "agents", "tiktoken", "questionary"]
+
+# name -> (code to run, module whose cumulative import time is measured, budget in ms, heavy modules allowed)
+SCENARIOS = {
+    "entry_point": ("import cli.src.cli", "cli.src.cli", 400, False),
+    "history": ("import cli.src.cli; from cli.src.history import PromptHistory", "cli.src.cli", 400, False),
+    "composer": ("import cli.src.prompt_composer", "cli.src.prompt_composer", 600, False),
+}
+
+IMPORTTIME_RE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def run_scenario(code: str, module: str) -> tuple[float, list[str]]:
+    """Run `code` in a fresh interpreter; return (cumulative import ms of `module`, heavy modules loaded)."""
+    probe = f"{code}\nimport sys\nprint(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=REPO_ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and match.group(3) == module and not match.group(2):
+            cumulative_us = int(match.group(1))
+    loaded = [m for m in proc.stdout.strip().split(',') if m]
+    return cumulative_us / 1000, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prompt-cli startup benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario (median is reported)")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiply every budget, e.g. for slow CI hosts")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    for name, (code, module, budget_ms, heavy_allowed) in SCENARIOS.items():
+        timings = []
+        loaded: list[str] = []
+        for _ in range(args.runs):
+            elapsed_ms, loaded = run_scenario(code, module)
+            timings.append(elapsed_ms)
+        median_ms = statistics.median(timings)
+        budget = budget_ms * args.budget_scale
+        ok = median_ms <= budget and (heavy_allowed or not loaded)
+        failed = failed or not ok
+        results[name] = {
+            "median_ms": round(median_ms, 1),
+            "min_ms": round(min(timings), 1),
+            "budget_ms": budget,
+            "heavy_modules_loaded": loaded,
+            "ok": ok,
+        }
+
+    if args.json:
+        print(json.dumps({"benchmark": "startup", "python": sys.version.split()[0], "results": results}, indent=2))
+    else:
+        for name, result in results.items():
+            status = "ok" if result["ok"] else "FAIL"
+            heavy = f" (loaded: {', '.join(result['heavy_modules_loaded'])})" if result["heavy_modules_loaded"] else ""
+            print(f"{name:<12} {result['median_ms']:>8.1f} ms  budget {result['budget_ms']:>6.0f} ms  {status}{heavy}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""Offline benchmark suite for prompt-cli.
+
+Runs without network access: model calls go to a local fake API server
+(benchmarks/fake_openai.py) with configurable latency, token rate and
+injected errors, and all history lives in a throwaway home directory.
+Scenarios:
+
+    generation   end-to-end generate_completion latency, plain and streamed
+    throughput   batch pipeline requests/second at several concurrency levels
+    history      history open, count, page and full get_history load over synthetic records
+    tokenizer    count_tokens / count_prompt_tokens cost
+    startup      import time of the entry points (see benchmarks/startup.py)
+
+Results are printed (or written) as JSON so releases can be compared; with
+--baseline the run exits non-zero when a timing regresses past --tolerance:
+
+    python benchmarks/suite.py --output bench.json
+    python benchmarks/suite.py --only history --sizes 1000,10000,100000
+    python benchmarks/suite.py --baseline bench.json --tolerance 0.25
+    python benchmarks/suite.py --only generation,throughput --cassette traffic.jsonl --time-scale 0
+
+With --cassette, generations replay recorded traffic (see cli/src/cassette.py)
+instead of calling the fake server.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from fake_openai import FakeOpenAIServer  # noqa: E402  (benchmarks/ is on sys.path when run as a script)
+
+SCENARIOS = ["generation", "throughput", "history", "tokenizer", "startup"]
+
+QUESTIONS = [
+    "a lighthouse on a basalt cliff during a storm",
+    "retro futuristic city at dawn --ar 21:9",
+    "portrait of an old fisherman, Rembrandt lighting",
+    "bioluminescent forest with floating spores",
+    "nosferatu --sref 3982906704",
+]
+
+
+def timed(fn, repeat: int) -> dict:
+    """Median and min wall time of `repeat` calls, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3)}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+# --- Scenarios ---
+
+def bench_generation(server: FakeOpenAIServer, args) -> dict:
+    """Sequential generate_completion calls, plain and streamed, against the fake server."""
+    from cli.src import runtime
+    from cli.src.prompt_composer import PromptComposer
+
+    composer = PromptComposer(use_cache=False)
+    composer.current_model = args.model
+    results = {}
+    for mode, on_delta in (("plain", None), ("streamed", lambda delta: None)):
+        # The first call pays for imports, client creation and the TCP connection
+        started = time.perf_counter()
+        runtime.run(composer.generate_completion("midjourney", QUESTIONS[0], on_delta=on_delta, show_cost=False))
+        first_call_ms = (time.perf_counter() - started) * 1000
+        server.reset_stats()
+        latencies, failures = [], 0
+        for i in range(args.requests):
+            started = time.perf_counter()
+            content, _ = runtime.run(composer.generate_completion(
+                "midjourney", QUESTIONS[i % len(QUESTIONS)], on_delta=on_delta, show_cost=False))
+            latencies.append((time.perf_counter() - started) * 1000)
+            failures += content is None
+        server_stats = server.stats()
+        median_ms = statistics.median(latencies)
+        results[mode] = {
+            "requests": args.requests,
+            "failures": failures,
+            "first_call_ms": round(first_call_ms, 2),
+            "median_ms": round(median_ms, 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "server_median_ms": server_stats["median_service_ms"],
+            # Time spent outside the (simulated) model: SDK, client and our own code
+            "client_overhead_ms": round(median_ms - server_stats["median_service_ms"], 2)
+                                  if server_stats["median_service_ms"] is not None else None,
+        }
+    return results
+
+
+def bench_throughput(server: FakeOpenAIServer, args) -> dict:
+    """Batch pipeline throughput (no cache, no saving) at each concurrency level."""
+    from rich.console import Console
+    from cli.src import runtime
+    from cli.src.batch import run_batch
+    from cli.src.prompt_composer import PromptComposer
+
+    composer = PromptComposer(use_cache=False)
+    composer.current_model = args.model
+    quiet = Console(file=io.StringIO())
+    results = {}
+    for concurrency in args.concurrency:
+        total = max(args.requests, concurrency * 4)
+        descriptions = ((i, QUESTIONS[i % len(QUESTIONS)]) for i in range(total))
+        server.reset_stats()
+        started = time.perf_counter()
+        stats = runtime.run(run_batch(composer, "midjourney", descriptions, io.StringIO(),
+                                      concurrency=concurrency, save=False, console=quiet))
+        elapsed = time.perf_counter() - started
+        server_stats = server.stats()
+        results[f"c{concurrency}"] = {
+            "concurrency": concurrency,
+            "requests": total,
+            "succeeded": stats["succeeded"],
+            "failed": stats["failed"],
+            "server_requests": server_stats["requests"],  # Includes the client's own retries
+            "injected_errors": server_stats["errors"],
+            "rate_limited": server_stats["rate_limited"],
+            "elapsed_s": round(elapsed, 3),
+            "requests_per_s": round(stats["succeeded"] / elapsed, 2),
+        }
+    return results
+
+
+def synthetic_records(count: int, prompt_type: str = "midjourney"):
+    """Yield `count` history records with realistic output sizes, oldest first."""
+    from cli.src.output_parser import parse_output
+    from fake_openai import make_output
+
+    start = datetime(2024, 1, 1)
+    templates = []
+    for question in QUESTIONS:
+        output = make_output(question, 5)
+        templates.append((question, output, parse_output(output, question)))
+    for i in range(count):
+        question, output, parsed = templates[i % len(templates)]
+        yield {
+            "prompt_type": prompt_type,
+            "model_used": "gpt-4o-mini",
+            "timestamp_iso": (start + timedelta(minutes=i)).isoformat(),
+            "question": f"{question} #{i}",
+            "output": output,
+            "cost_info": {"input_cost": 0.00013, "output_cost": 0.00015, "total_cost": 0.00028,
+                          "input_tokens": 860, "output_tokens": 250, "usage_source": "api"},
+            **parsed,
+        }
+
+
+def bench_history(args) -> dict:
+    """Open and query history stores of each size, built fresh in the temporary home."""
+    from cli.src.history import PromptHistory
+    from cli.src.history_store import HistoryStore, PROMPT_CLI_DIR, INSERT_ENTRY
+
+    results = {}
+    for size in args.sizes:
+        shutil.rmtree(PROMPT_CLI_DIR, ignore_errors=True)
+        store = HistoryStore()
+        started = time.perf_counter()
+        with store.conn:
+            store.conn.executemany(INSERT_ENTRY, (HistoryStore._entry_params(record, None)
+                                                  for record in synthetic_records(size)))
+        ingest_s = time.perf_counter() - started
+        store.close()
+
+        opened = []
+        open_timing = timed(lambda: opened.append(PromptHistory()), args.repeat)
+        for extra in opened[:-1]:
+            extra.store.close()
+        history = opened[-1]
+        last_page = history.get_page("midjourney", offset=max(0, size - history.page_size))
+        results[str(size)] = {
+            "ingest_records_per_s": round(size / ingest_s),
+            "open": open_timing,
+            "count": timed(lambda: history.count_history("midjourney"), args.repeat),
+            "first_page": timed(lambda: history.get_page("midjourney"), args.repeat),
+            "deep_page_offset": timed(lambda: history.get_page("midjourney", offset=max(0, size - history.page_size)),
+                                      args.repeat),
+            "deep_page_keyset": timed(lambda: history.get_page("midjourney", after=last_page[0]["cursor"]),
+                                      args.repeat),
+            "get_history_page": timed(lambda: history.get_history("midjourney", limit=history.page_size), args.repeat),
+            "get_history_all": timed(lambda: history.get_history("midjourney"), 1 if size > 10_000 else args.repeat),
+            "search": timed(lambda: history.get_page("midjourney", "lighthouse"), args.repeat),
+            "param_filter": timed(lambda: history.get_page("midjourney", param_filters=[("sref", "3982906704")]),
+                                  args.repeat),
+        }
+        history.store.close()
+    return results
+
+
+def bench_tokenizer(args) -> dict:
+    """Token counting cost for short questions, long outputs and memoized system prompts."""
+    from cli.src import tokenization
+    from cli.src.agents_config import load_prompt, PLATFORMS
+    from fake_openai import make_output
+
+    system_prompt = load_prompt(PLATFORMS["midjourney"]["prompt_file"])
+    output = make_output(QUESTIONS[0], 5)
+    started = time.perf_counter()
+    tokenization.get_encoding(args.model)
+    load_ms = (time.perf_counter() - started) * 1000
+    loops = max(1, args.repeat) * 200
+
+    def per_call_us(fn) -> float:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        return round((time.perf_counter() - started) / loops * 1_000_000, 2)
+
+    tokenization.count_tokens_cached.cache_clear()
+    outputs = [output] * 256
+    started = time.perf_counter()
+    tokenization.count_tokens_batch(outputs, args.model)
+    batch_s = time.perf_counter() - started
+    return {
+        "encoding_load_ms": round(load_ms, 2),
+        "question_us": per_call_us(lambda: tokenization.count_tokens(QUESTIONS[1], args.model)),
+        "output_us": per_call_us(lambda: tokenization.count_tokens(output, args.model)),
+        "system_prompt_us": per_call_us(lambda: tokenization.count_tokens(system_prompt, args.model)),
+        "prompt_tokens_memoized_us": per_call_us(
+            lambda: tokenization.count_prompt_tokens(system_prompt, QUESTIONS[1], args.model)),
+        "batch_outputs_per_s": round(len(outputs) / batch_s),
+    }
+
+
+def bench_startup(args) -> dict:
+    from startup import SCENARIOS as STARTUP_SCENARIOS, run_scenario
+
+    results = {}
+    for name, (code, module, _, _) in STARTUP_SCENARIOS.items():
+        timings, loaded = [], []
+        for _ in range(args.repeat):
+            elapsed_ms, loaded = run_scenario(code, module)
+            timings.append(elapsed_ms)
+        results[name] = {"median_ms": round(statistics.median(timings), 1), "min_ms": round(min(timings), 1),
+                         "heavy_modules_loaded": loaded}
+    return results
+
+
+# --- Reporting ---
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """Map "scenario.case.metric" to every numeric timing (keys ending in _ms or _us)."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and key.endswith(("_ms", "_us")) and key != "server_median_ms":
+            flat[path] = value
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Timings that got more than `tolerance` slower than in the baseline."""
+    current, previous = flatten(results), flatten(baseline.get("results", {}))
+    regressions = []
+    for key, value in current.items():
+        before = previous.get(key)
+        # Sub-millisecond noise is not a regression
+        if before and value > before * (1 + tolerance) and value - before > 0.5:
+            regressions.append(f"{key}: {before} -> {value} (+{(value / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prompt-cli offline benchmark suite")
+    parser.add_argument("--only", help=f"Comma-separated scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=20, help="Generations per measurement")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated batch concurrency levels")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated synthetic history sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per timing (median is reported)")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model name sent to the fake server")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake server seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0, help="Fake server output token rate")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake server requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of injected errors")
+    parser.add_argument("--rpm-limit", type=int, help="Fake server requests per minute before it answers 429")
+    parser.add_argument("--cassette", help="Replay model calls from this recorded cassette instead of the fake server")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply recorded latencies when replaying")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.sizes = [int(s) for s in args.sizes.split(",")]
+    selected = args.only.split(",") if args.only else SCENARIOS
+    unknown = [s for s in selected if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    # Everything prompt-cli writes goes to a throwaway home; this must happen
+    # before cli.src is imported, since it resolves ~/.prompt-cli at import time.
+    home = tempfile.mkdtemp(prefix="prompt-cli-bench-")
+    os.environ["HOME"] = home
+    os.environ["OPENAI_API_KEY"] = "fake-key"
+    os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"  # No trace uploads to the real API
+    if args.cassette:
+        os.environ["PROMPT_CLI_CASSETTE"] = os.path.abspath(args.cassette)
+        os.environ["PROMPT_CLI_CASSETTE_MODE"] = "replay"
+        os.environ["PROMPT_CLI_CASSETTE_TIME_SCALE"] = str(args.time_scale)
+
+    results = {}
+    try:
+        with FakeOpenAIServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                              error_rate=args.error_rate, error_status=args.error_status,
+                              rpm_limit=args.rpm_limit) as server:
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            runners = {
+                "generation": lambda: bench_generation(server, args),
+                "throughput": lambda: bench_throughput(server, args),
+                "history": lambda: bench_history(args),
+                "tokenizer": lambda: bench_tokenizer(args),
+                "startup": lambda: bench_startup(args),
+            }
+            for name in selected:
+                print(f"Running {name}...", file=sys.stderr)
+                try:
+                    results[name] = runners[name]()
+                except Exception as e:
+                    # e.g. tiktoken cannot download its encoding offline; keep the other results
+                    results[name] = {"error": f"{type(e).__name__}: {str(e)}"}
+                    print(f"{name} failed: {results[name]['error']}", file=sys.stderr)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    report = {
+        "benchmark": "suite",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {key: getattr(args, key) for key in ("requests", "concurrency", "sizes", "repeat", "model",
+                                                       "latency", "tokens_per_second", "error_rate", "rpm_limit",
+                                                       "cassette", "time_scale")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
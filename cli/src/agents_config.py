@@ -1,8 +1,7 @@
-from openai import AsyncOpenAI
 import os
-from cli.src.utils import count_tokens
+import threading
 from dotenv import load_dotenv
-from agents import Agent, ModelSettings
+from cli.src.profiling import timed
 
 # Load environment variables from .env file
 load_dotenv()
@@ -10,53 +9,93 @@ load_dotenv()
 # Use the API key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Agent name and system prompt file for each supported platform
+PLATFORMS = {
+    'midjourney': {
+        'name': "Midjourney Prompt Generator",
+        'prompt_file': 'prompts/midjourney.txt'
+    },
+    'udio': {
+        'name': "Udio Prompt Generator",
+        'prompt_file': 'prompts/udio.txt'
+    },
+    'suno': {
+        'name': "Suno AI Prompt Generator",
+        'prompt_file': 'prompts/suno.txt'
+    }
+}
+
+# Agent name -> platform, for labelling calls made with an agent
+PLATFORM_BY_AGENT_NAME = {config['name']: platform for platform, config in PLATFORMS.items()}
+
+# Settings every agent starts from; callers may override them per agent
+DEFAULT_MODEL_SETTINGS = {'temperature': 0}
+
+_lock = threading.Lock()
+# full path -> (mtime_ns, size, text)
+_prompt_cache: dict[str, tuple[int, int, str]] = {}
+# (platform, model, settings) -> (instructions, agent)
+_agent_cache: dict[tuple, tuple[str, object]] = {}
+
 def load_prompt(file_path):
-    """Load a prompt from a file."""
+    """Load a prompt from a file, reusing the cached text until the file changes."""
     pkg_dir = os.path.dirname(__file__)
-    full_path = os.path.join(pkg_dir, '..', file_path)
-    with open(full_path, 'r') as file:
-        return file.read()
+    full_path = os.path.normpath(os.path.join(pkg_dir, '..', file_path))
+    stat = os.stat(full_path)
+    with _lock:
+        cached = _prompt_cache.get(full_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+    with open(full_path, 'r', encoding='utf-8') as file:
+        text = file.read()
+    with _lock:
+        _prompt_cache[full_path] = (stat.st_mtime_ns, stat.st_size, text)
+    return text
 
-# Create agents for different prompt types
-def create_midjourney_agent(model="gpt-4o-mini"):
-    """Create an agent for Midjourney prompt generation."""
-    system_prompt = load_prompt('prompts/midjourney.txt')
+@timed("agent.get")
+def get_agent(platform, model="gpt-4o-mini", **settings):
+    """Return the agent for a platform, model and model settings, building it only once.
+
+    Agents are rebuilt when their prompt file changes on disk.
+    """
+    from agents import Agent, ModelSettings  # Loads the Agents SDK on first use
+
+    instructions = load_prompt(PLATFORMS[platform]['prompt_file'])
+    merged_settings = {**DEFAULT_MODEL_SETTINGS, **settings}
+    key = (platform, model, tuple(sorted(merged_settings.items())))
+    with _lock:
+        cached = _agent_cache.get(key)
+        # load_prompt returns the same str object until the file changes
+        if cached and cached[0] is instructions:
+            return cached[1]
 
     # Note: Midjourney v7's Draft mode is selected in the UI and not relevant to include in the prompt itself.
-    return Agent(
-        name="Midjourney Prompt Generator",
-        instructions=system_prompt,
+    agent = Agent(
+        name=PLATFORMS[platform]['name'],
+        instructions=instructions,
         model=model,
-        model_settings=ModelSettings(
-            temperature=0
-        ),
+        model_settings=ModelSettings(**merged_settings),
         mcp_config={"convert_schemas_to_strict": True}
     )
+    with _lock:
+        _agent_cache[key] = (instructions, agent)
+    return agent
+
+def clear_agent_cache():
+    """Drop all memoized agents and prompt texts."""
+    with _lock:
+        _agent_cache.clear()
+        _prompt_cache.clear()
+
+# Create agents for different prompt types
+def create_midjourney_agent(model="gpt-4o-mini"):
+    """Create an agent for Midjourney prompt generation."""
+    return get_agent('midjourney', model)
 
 def create_udio_agent(model="gpt-4o-mini"):
     """Create an agent for Udio prompt generation."""
-    system_prompt = load_prompt('prompts/udio.txt')
-
-    return Agent(
-        name="Udio Prompt Generator",
-        instructions=system_prompt,
-        model=model,
-        model_settings=ModelSettings(
-            temperature=0
-        ),
-        mcp_config={"convert_schemas_to_strict": True}
-    )
+    return get_agent('udio', model)
 
 def create_suno_agent(model="gpt-4o-mini"):
     """Create an agent for Suno AI prompt generation."""
-    system_prompt = load_prompt('prompts/suno.txt')
-
-    return Agent(
-        name="Suno AI Prompt Generator",
-        instructions=system_prompt,
-        model=model,
-        model_settings=ModelSettings(
-            temperature=0
-        ),
-        mcp_config={"convert_schemas_to_strict": True}
-    )
+    return get_agent('suno', model)
@@ -0,0 +1,141 @@
+import sys
+import json
+import asyncio
+from typing import Iterator, TextIO
+from rich.console import Console
+from cli.src.utils import completion_price_info, cached_price_info, get_agent_completion
+from cli.src import runtime
+from cli.src import agents_config
+from cli.src import cassette as cassettes
+from cli.src.costs import BudgetExceeded
+
+
+def iter_descriptions(stream: TextIO) -> Iterator[tuple[int, str]]:
+    """Yield (index, description) pairs from a JSONL or plain-text stream.
+
+    JSONL lines may use a "description", "question" or "prompt" field; any other
+    non-blank line is taken verbatim as a description.
+    """
+    index = 0
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        description = line
+        if line.startswith('{'):
+            try:
+                data = json.loads(line)
+                description = data.get("description") or data.get("question") or data.get("prompt") or ""
+            except json.JSONDecodeError:
+                pass  # Not JSON after all, treat as plain text
+        if description:
+            yield index, description
+            index += 1
+
+
+async def run_batch(composer, prompt_type: str, descriptions: Iterator[tuple[int, str]], out: TextIO,
+                    concurrency: int = 8, save: bool = True, console: Console | None = None) -> dict:
+    """Generate prompts for every description with at most `concurrency` calls in flight.
+
+    Results are written to `out` as JSON lines in completion order, so callers
+    can consume them while the batch is still running. Returns summary stats.
+    """
+    console = console or Console(stderr=True)
+    agent = composer.get_agent(prompt_type)
+    system_prompt = composer.get_system_prompt(prompt_type)
+    model = composer.current_model
+    cache = composer.response_cache
+    # Replayed calls cost nothing, so they skip the budget and the cost ledger
+    billed = not cassettes.replaying()
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"total": 0, "succeeded": 0, "failed": 0, "cache_hits": 0, "over_budget": 0, "total_cost": 0.0}
+
+    async def worker(index: int, description: str):
+        reserved = 0.0
+        try:
+            result = {"index": index, "prompt_type": prompt_type, "model_used": model, "question": description}
+            hit = cache.get(agent, description) if cache else None
+            cached = hit is not None
+            used_model = model
+            try:
+                if cached:
+                    content, usage = hit
+                else:
+                    # The budget may refuse the call or move it to a cheaper model
+                    if billed:
+                        used_model, reserved = composer.budget.reserve(prompt_type, model, system_prompt,
+                                                                       description)
+                    used_agent = agent if used_model == model else agents_config.get_agent(prompt_type, model=used_model)
+                    content, usage = await get_agent_completion(used_agent, description)
+                    if cache:
+                        cache.put(used_agent, description, content, usage)
+            except Exception as e:
+                stats["failed"] += 1
+                if isinstance(e, BudgetExceeded):
+                    stats["over_budget"] += 1
+                result["error"] = f"{type(e).__name__}: {str(e)}"
+                console.print(f"[bold red]#{index} failed: {result['error']}[/bold red]")
+            else:
+                price_info = completion_price_info(system_prompt, description, content, usage, used_model)
+                if cached:
+                    price_info = cached_price_info(price_info)
+                    stats["cache_hits"] += 1
+                elif billed:
+                    composer.record_cost(prompt_type, used_model, price_info)
+                stats["succeeded"] += 1
+                stats["total_cost"] += price_info["total_cost"]
+                result["model_used"] = used_model
+                result["output"] = content
+                result["cost_info"] = price_info
+                if save:
+                    result["path"] = composer.save_output(prompt_type, description, content, price_info,
+                                                          model=used_model)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+        finally:
+            composer.budget.release(reserved)
+            semaphore.release()
+
+    # Acquire before creating each task so only `concurrency` descriptions are
+    # read ahead of the workers; the input is never loaded into memory at once.
+    pending = set()
+    for index, description in descriptions:
+        await semaphore.acquire()
+        stats["total"] += 1
+        task = asyncio.create_task(worker(index, description))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+    stats["total_cost"] = round(stats["total_cost"], 6)
+    return stats
+
+
+def batch_main(args):
+    """Entry point for `prompt-cli batch`."""
+    from cli.src.prompt_composer import PromptComposer
+
+    console = Console(stderr=True)
+    composer = PromptComposer(use_cache=not args.no_cache)
+    if args.model:
+        if args.model not in composer.models:
+            console.print(f"[bold red]Unknown model '{args.model}'. Choose from: {', '.join(composer.models)}[/bold red]")
+            return 1
+        composer.current_model = args.model
+
+    in_stream = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+    out_stream = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    try:
+        stats = runtime.run(run_batch(composer, args.type, iter_descriptions(in_stream), out_stream,
+                                       concurrency=args.concurrency, save=not args.no_save, console=console))
+    finally:
+        if in_stream is not sys.stdin:
+            in_stream.close()
+        if out_stream is not sys.stdout:
+            out_stream.close()
+
+    over_budget = f", {stats['over_budget']} over budget" if stats["over_budget"] else ""
+    console.print(f"[dim]Batch complete: {stats['succeeded']}/{stats['total']} succeeded, "
+                  f"{stats['failed']} failed{over_budget}, {stats['cache_hits']} from cache | Cost: ${stats['total_cost']:.4f}[/dim]")
+    return 0 if not stats["failed"] else 2
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+RECORD = "record"
+REPLAY = "replay"
+MODES = (RECORD, REPLAY)
+
+# Word-sized fragments (with their trailing whitespace) for replaying streams
+DELTA_RE = re.compile(r'\S+\s*|\s+')
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def chat_key(messages: list[dict], model: str) -> str:
+    """Fingerprint of a Chat Completions request (temperature is always 0)."""
+    payload = {"messages": messages, "model": model, "temperature": 0}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """Record model calls to a JSONL file, or serve them back without the network.
+
+    One line per call: the request fingerprint (the same hash the response
+    cache uses), the response text, usage, total latency and time to first
+    token. Requests themselves are not stored beyond a short preview. When a
+    request was recorded several times, replay cycles through the recordings
+    in order. Replay sleeps for the recorded latency times `time_scale`
+    (0 serves everything instantly); streams are replayed word by word,
+    spread between the first token and the end of the recording.
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY, time_scale: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of: {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self._lock = threading.Lock()
+        self._entries: dict[str, list[dict]] = defaultdict(list)
+        self._next: dict[str, int] = defaultdict(int)
+        if mode == REPLAY:
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._entries[entry["key"]].append(entry)
+
+    # --- Record ---
+
+    def record(self, kind: str, key: str, model: str, user_input: str, content: str, usage: dict | None,
+               latency_s: float, ttft_s: float | None = None):
+        entry = {
+            "key": key,
+            "kind": kind,
+            "model": model,
+            "input": user_input[:80],  # Preview only, to make cassettes readable
+            "content": content,
+            "usage": usage,
+            "latency_s": round(latency_s, 4),
+            "ttft_s": round(ttft_s, 4) if ttft_s is not None else None,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self.mode == RECORD:
+            with self._lock:
+                self._file.close()
+
+    # --- Replay ---
+
+    def _take(self, key: str) -> dict:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"No recorded response for this request in {self.path} (fingerprint {key[:12]})")
+            entry = entries[self._next[key] % len(entries)]
+            self._next[key] += 1
+            return entry
+
+    async def replay(self, key: str, on_delta=None) -> tuple[str, dict | None]:
+        """Serve a recorded response, optionally streaming it to on_delta; returns (content, usage)."""
+        entry = self._take(key)
+        content = entry["content"]
+        latency = entry["latency_s"] * self.time_scale
+        if on_delta is None:
+            if latency:
+                await asyncio.sleep(latency)
+            return content, entry["usage"]
+
+        ttft = (entry["ttft_s"] if entry.get("ttft_s") is not None else entry["latency_s"]) * self.time_scale
+        deltas = DELTA_RE.findall(content) or [content]
+        if ttft:
+            await asyncio.sleep(ttft)
+        gap = max(0.0, latency - ttft) / len(deltas)
+        for delta in deltas:
+            on_delta(delta)
+            if gap:
+                await asyncio.sleep(gap)
+        return content, entry["usage"]
+
+
+_active: Cassette | None = None
+
+
+def use(path: str, mode: str = REPLAY, time_scale: float = 1.0) -> Cassette:
+    """Route every model call through a cassette from now on."""
+    global _active
+    stop()
+    _active = Cassette(path, mode, time_scale)
+    return _active
+
+
+def stop():
+    global _active
+    if _active is not None:
+        _active.close()
+    _active = None
+
+
+def active() -> Cassette | None:
+    """The cassette in use, if any; PROMPT_CLI_CASSETTE (and _MODE, _TIME_SCALE) select one without flags."""
+    if _active is None and os.getenv("PROMPT_CLI_CASSETTE"):
+        use(os.environ["PROMPT_CLI_CASSETTE"], os.getenv("PROMPT_CLI_CASSETTE_MODE", REPLAY),
+            float(os.getenv("PROMPT_CLI_CASSETTE_TIME_SCALE", "1.0")))
+    return _active
+
+
+def replaying() -> bool:
+    """True while model calls are answered from a cassette, so nothing is billed."""
+    cassette = active()
+    return cassette is not None and cassette.replaying
+
+
+def agent_key(agent, user_input: str) -> str:
+    """Fingerprint of an agent run, shared with the response cache."""
+    from cli.src.response_cache import cache_key
+    return cache_key(agent, user_input)
@@ -1,16 +1,27 @@
 import os
+import sys
+import argparse
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.theme import Theme
-from cli.src.prompt_composer import PromptComposer
+from cli.src.history import PromptHistory
+from cli.src import cassette as cassettes
+from cli.src import profiling
+from cli.src import metrics
+from cli.src.history_store import PROMPT_CLI_DIR
+from cli.src.segment_log import CompactionIncomplete
+from cli.src.output_parser import parse_param_filter, normalize_param_name
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Check for OpenAI API key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("No OpenAI API key found. Please check your .env file.")
+def require_api_key():
+    """Check for the OpenAI API key; only commands that call the model need it."""
+    cassette = cassettes.active()
+    if cassette and cassette.replaying:
+        return  # Replayed responses never reach the API
+    if not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("No OpenAI API key found. Please check your .env file.")
 
 custom_theme = Theme({
     "info": "cyan",
@@ -23,15 +34,217 @@ console = Console(theme=custom_theme)
 
 HEADER = "AI Prompt Generator"
 
+PROMPT_TYPES = ["midjourney", "udio", "suno"]
+
+# Plain-text outputs written by the first versions of the CLI
+LEGACY_OUTPUT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'output'))
+
+def run_cli_app(use_cache=True, stream=False):
+    # The composer (and with it the model stack) is only imported for generation
+    from cli.src.prompt_composer import PromptComposer
+
+    require_api_key()
+    composer = PromptComposer(use_cache=use_cache, stream=stream)
+    console.print(HEADER, style="bold cyan")
+    composer.run()
+
+def show_history(prompt_type, limit, view_index=None, search_term=None, param_filters=None):
+    history = PromptHistory()
+
+    if view_index is not None:
+        history.view_prompt(prompt_type, view_index, search_term, param_filters)
+    else:
+        history.display_history(prompt_type, limit, search_term, param_filters)
+
+def show_param_values(prompt_type=None, name=None, limit=50):
+    from rich.table import Table
+
+    history = PromptHistory()
+    rows = history.store.param_values(prompt_type, normalize_param_name(name.lstrip("-")) if name else None, limit)
+    if not rows:
+        console.print("[warning]No Midjourney parameters found in history.[/warning]")
+        return
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Parameter", style="cyan")
+    table.add_column("Value")
+    table.add_column("Entries", justify="right", style="green")
+    for row in rows:
+        table.add_row(f"--{row['name']}", row["value"] or "-", str(row["entries"]))
+    console.print(table)
+
+def compact_history(prompt_type=None, keep_json=False):
+    history = PromptHistory()
+    for p_type in [prompt_type] if prompt_type else PROMPT_TYPES:
+        try:
+            stats = history.store.compact_log(history.log, p_type, remove_json=not keep_json)
+        except CompactionIncomplete as e:
+            console.print(f"[error]{p_type}: {str(e)}[/error]")
+            continue
+        if not stats["records"] and not stats["segments_before"]:
+            continue
+        console.print(f"[success]{p_type}: {stats['records']} records, {stats['segments_before']} -> "
+                      f"{stats['segments_after']} segments ({stats['bytes_before']:,} -> {stats['bytes_after']:,} bytes), "
+                      f"{stats['json_files_folded']} JSON files folded in, {stats['json_files_removed']} removed[/success]")
+
+def reindex_history(workers=None, processes=False):
+    history = PromptHistory()
+    stats = history.sync_json_files(force=True, workers=workers, processes=processes)
+    indexed = history.store.index_log(history.log)
+    console.print(f"[success]JSON files: {stats['added']} added, {stats['updated']} re-read, {stats['removed']} removed; "
+                  f"{indexed} new log records indexed[/success]")
+
+def import_legacy(root_dir):
+    history = PromptHistory()
+    with console.status("[bold green]Importing legacy outputs...[/bold green]") as status:
+        stats = history.store.import_legacy_text(
+            root_dir, progress=lambda done: status.update(f"[bold green]Importing legacy outputs... {done:,} files[/bold green]"))
+    console.print(f"[success]Imported {stats['imported']} files, skipped {stats['skipped']} already imported, "
+                  f"{stats['invalid']} not in the legacy format[/success]")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="AI Prompt Generator CLI")
+    parser.add_argument("--history", choices=PROMPT_TYPES, help="View history for a specific prompt type")
+    parser.add_argument("--history-interactive", choices=PROMPT_TYPES, help="Interactive history browser")
+    parser.add_argument("--limit", type=int, default=10, help="Limit the number of history items to display")
+    parser.add_argument("--view", type=int, help="View a specific prompt by index")
+    parser.add_argument("--search", help="Full-text search over history prompts and outputs (supports \"phrases\" and prefix*)")
+    parser.add_argument("--param", action="append", metavar="NAME=VALUE",
+                        help="Only show history whose Midjourney prompt uses this parameter, e.g. sref=3982906704 (repeatable; NAME alone matches any value)")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the model instead of reusing cached responses")
+    parser.add_argument("--stream", action="store_true", help="Show generated output token by token as it arrives")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="FILE", help="Record every model call to a cassette file (JSONL)")
+    cassette.add_argument("--replay", metavar="FILE", help="Serve model calls from a recorded cassette instead of the API")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print a per-stage timing breakdown on exit and append span records to --profile-file")
+    parser.add_argument("--profile-file", metavar="FILE", default=os.path.join(PROMPT_CLI_DIR, 'profile.jsonl'),
+                        help="JSON lines file for span records (default: ~/.prompt-cli/profile.jsonl)")
+    parser.add_argument("--metrics-textfile", metavar="FILE", default=os.getenv("PROMPT_CLI_METRICS_TEXTFILE"),
+                        help="Accumulate Prometheus metrics in this file, e.g. for node_exporter's textfile collector")
+    parser.add_argument("--metrics-port", type=int, default=os.getenv("PROMPT_CLI_METRICS_PORT"),
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running")
+    parser.add_argument("--replay-time-scale", type=float, default=1.0,
+                        help="Multiply recorded latencies when replaying (0 = no delay)")
+
+    subparsers = parser.add_subparsers(dest="command")
+    batch = subparsers.add_parser("batch", help="Generate prompts for many descriptions without the interactive menu")
+    batch.add_argument("--type", required=True, choices=PROMPT_TYPES, help="Prompt type to generate")
+    batch.add_argument("--input", required=True, help="JSONL or plain-text file with one description per line ('-' for stdin)")
+    batch.add_argument("--output", default="-", help="File to append JSONL results to (default: stdout)")
+    batch.add_argument("--concurrency", type=int, default=8, help="Maximum number of generations in flight")
+    batch.add_argument("--model", help="Model to use (defaults to the interactive default)")
+    batch.add_argument("--no-save", action="store_true", help="Do not save results to history")
+    batch.add_argument("--no-cache", action="store_true", default=argparse.SUPPRESS,
+                       help="Always call the model instead of reusing cached responses")
+
+    compare = subparsers.add_parser("compare", help="Run one description through several models and compare latency and cost")
+    compare.add_argument("--type", choices=PROMPT_TYPES, help="Prompt type to generate (required unless --summary)")
+    compare.add_argument("--question", help="Description to send to every model")
+    compare.add_argument("--models", help="Comma-separated model ids (default: all configured models)")
+    compare.add_argument("--no-outputs", action="store_true", help="Only print the comparison table")
+    compare.add_argument("--summary", action="store_true", help="Show per-model averages over past comparisons")
+
+    compact = subparsers.add_parser("compact", help="Rewrite the history log into dense segments and fold in legacy JSON files")
+    compact.add_argument("--type", choices=PROMPT_TYPES, help="Only compact this prompt type (default: all)")
+    compact.add_argument("--keep-json", action="store_true", help="Keep legacy per-generation JSON files after folding them into the log")
+
+    reindex = subparsers.add_parser("reindex", help="Re-read every legacy JSON history file and index any new history log records")
+    reindex.add_argument("--workers", type=int, help="Number of parallel readers (default: based on CPU count)")
+    reindex.add_argument("--processes", action="store_true", help="Parse files in worker processes instead of threads")
+
+    legacy = subparsers.add_parser("import-legacy", help="Import legacy .txt outputs (Prompt:/Output: files) into history")
+    legacy.add_argument("--dir", default=LEGACY_OUTPUT_DIR, help="Directory with one sub-directory per prompt type (default: cli/output)")
+
+    params = subparsers.add_parser("params", help="List the Midjourney parameters used in history and how often")
+    params.add_argument("--type", choices=PROMPT_TYPES, help="Only count this prompt type (default: all)")
+    params.add_argument("--name", help="Only list values of this parameter, e.g. sref")
+    params.add_argument("--limit", type=int, default=50, help="Maximum number of rows to show")
+
+    costs = subparsers.add_parser("costs", help="Report spend by day, model or prompt type and manage budgets")
+    costs.add_argument("--by", choices=["day", "model", "type"], default="day", help="How to group spend (default: day)")
+    costs.add_argument("--days", type=int, default=30, help="Only count the last N days, including today (0 = all time)")
+    costs.add_argument("--type", choices=PROMPT_TYPES, help="Only count this prompt type")
+    costs.add_argument("--model", help="Only count this model")
+    costs.add_argument("--daily-budget", type=float, metavar="DOLLARS", help="Set the daily spending cap (0 removes it)")
+    costs.add_argument("--monthly-budget", type=float, metavar="DOLLARS", help="Set the monthly spending cap (0 removes it)")
+    costs.add_argument("--budget-action", choices=["refuse", "downgrade"],
+                       help="Over budget, refuse the call or switch to a cheaper model that fits")
+    return parser
+
 def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.search and not (args.history or args.history_interactive):
+        parser.error("--search requires --history or --history-interactive")
+    if args.param and not (args.history or args.history_interactive):
+        parser.error("--param requires --history or --history-interactive")
+    try:
+        param_filters = [parse_param_filter(p) for p in args.param] if args.param else None
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "batch" and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.command == "reindex" and args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.command == "costs" and (args.days < 0 or (args.daily_budget or 0) < 0 or (args.monthly_budget or 0) < 0):
+        parser.error("--days and budgets must not be negative")
+    if args.replay_time_scale < 0:
+        parser.error("--replay-time-scale must not be negative")
+    if args.replay and not os.path.exists(args.replay):
+        parser.error(f"cassette not found: {args.replay}")
+    if args.command == "compare" and not args.summary and not (args.type and args.question):
+        parser.error("compare requires --type and --question unless --summary is given")
+
+    if args.record:
+        cassettes.use(args.record, cassettes.RECORD)
+    elif args.replay:
+        cassettes.use(args.replay, cassettes.REPLAY, args.replay_time_scale)
+    if args.profile:
+        profiling.enable(args.profile_file)
+    if args.metrics_textfile:
+        metrics.start_textfile_exporter(args.metrics_textfile)
+    if args.metrics_port:
+        try:
+            metrics.start_http_exporter(args.metrics_port)
+        except OSError as e:
+            console.print(f"[warning]Could not serve metrics on port {args.metrics_port}: {str(e)}[/warning]")
+
     try:
-        composer = PromptComposer()
-        console.print(HEADER, style="bold cyan")
-        composer.run()
+        if args.command == "batch":
+            from cli.src.batch import batch_main
+            require_api_key()
+            sys.exit(batch_main(args))
+        elif args.command == "compare":
+            from cli.src.compare import compare_main
+            if not args.summary:
+                require_api_key()
+            sys.exit(compare_main(args))
+        elif args.command == "import-legacy":
+            import_legacy(args.dir)
+        elif args.command == "reindex":
+            reindex_history(args.workers, args.processes)
+        elif args.command == "compact":
+            compact_history(args.type, args.keep_json)
+        elif args.command == "costs":
+            from cli.src.costs import costs_main
+            sys.exit(costs_main(args))
+        elif args.command == "params":
+            show_param_values(args.type, args.name, args.limit)
+        elif args.history_interactive:
+            history = PromptHistory()
+            history.interactive_history(args.history_interactive, args.search, param_filters)
+        elif args.history:
+            show_history(args.history, args.limit, args.view, args.search, param_filters)
+        else:
+            run_cli_app(use_cache=not args.no_cache, stream=args.stream)
     except KeyboardInterrupt:
         console.print("\n[info]Exiting.[/info]")
     except Exception as e:
         console.print(f"[bold red]An error occurred: {str(e)}[/bold red]")
+    finally:
+        if args.profile:
+            # On stderr, so batch output on stdout stays valid JSONL
+            profiling.render_report(Console(theme=custom_theme, stderr=True))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,149 @@
+import time
+import uuid
+import asyncio
+from datetime import datetime
+from rich.console import Console
+from rich.table import Table
+from cli.src import agents_config
+from cli.src import runtime
+from cli.src import cassette as cassettes
+from cli.src.costs import BudgetExceeded
+from cli.src.utils import completion_price_info, stream_agent_completion
+
+
+async def run_model(composer, prompt_type: str, question: str, model: str) -> dict:
+    """Run one model, timing the full response and the first token.
+
+    The response cache is bypassed, since the point is to measure the model.
+    Models over budget are refused, not downgraded, as a swap would defeat the comparison.
+    """
+    result = {"model": model}
+    first_token_at = None
+
+    def on_delta(delta: str):
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+
+    system_prompt = composer.get_system_prompt(prompt_type)
+    # Replayed calls cost nothing, so they skip the budget and the cost ledger
+    billed = not cassettes.replaying()
+    reserved = 0.0
+    try:
+        if billed:
+            _, reserved = composer.budget.reserve(prompt_type, model, system_prompt, question, allow_downgrade=False)
+    except BudgetExceeded as e:
+        result["latency_s"] = 0.0
+        result["error"] = f"{type(e).__name__}: {str(e)}"
+        return result
+
+    started = time.perf_counter()
+    try:
+        agent = agents_config.get_agent(prompt_type, model=model)
+        content, usage = await stream_agent_completion(agent, question, on_delta)
+    except Exception as e:
+        composer.budget.release(reserved)
+        result["latency_s"] = round(time.perf_counter() - started, 3)
+        result["error"] = f"{type(e).__name__}: {str(e)}"
+        return result
+
+    result["latency_s"] = round(time.perf_counter() - started, 3)
+    result["ttft_s"] = round(first_token_at - started, 3) if first_token_at else None
+    price_info = completion_price_info(system_prompt, question, content, usage, model)
+    if billed:
+        composer.record_cost(prompt_type, model, price_info)
+    composer.budget.release(reserved)
+    result.update({
+        "input_tokens": price_info["input_tokens"],
+        "output_tokens": price_info["output_tokens"],
+        "total_cost": price_info["total_cost"],
+        "usage_source": price_info["usage_source"],
+        "output": content,
+        "path": composer.save_output(prompt_type, question, content, price_info, model=model),
+    })
+    return result
+
+
+async def compare_models(composer, prompt_type: str, question: str, models: list[str]) -> list[dict]:
+    """Run the same question against several models in parallel and persist the results."""
+    timestamp = datetime.now()
+    results = await asyncio.gather(*(run_model(composer, prompt_type, question, model) for model in models))
+    # Like replayed generations, replayed comparisons stay out of the user's history
+    store = composer.replay_history[0] if cassettes.replaying() else composer.history_handler.store
+    store.add_comparison(uuid.uuid4().hex, prompt_type, timestamp.isoformat(), question, results)
+    return list(results)
+
+
+def render_comparison(console: Console, composer, results: list[dict], show_outputs: bool = True):
+    """Print a side-by-side latency/cost table, followed by each model's output."""
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Model", style="cyan")
+    table.add_column("Latency", justify="right")
+    table.add_column("First token", justify="right")
+    table.add_column("Tokens in/out", justify="right")
+    table.add_column("Cost", justify="right", style="green")
+    for result in sorted(results, key=lambda r: (r.get("error") is not None, r.get("latency_s") or 0)):
+        name = composer.models.get(result["model"], {}).get("name", result["model"])
+        if result.get("error"):
+            table.add_row(name, f"{result['latency_s']:.2f}s", "-", "-", f"[error]{result['error']}[/error]")
+            continue
+        ttft = f"{result['ttft_s']:.2f}s" if result.get("ttft_s") is not None else "-"
+        tokens = f"{result['input_tokens']}/{result['output_tokens']}"
+        if result.get("usage_source") == "estimate":
+            tokens += " (est.)"
+        table.add_row(name, f"{result['latency_s']:.2f}s", ttft, tokens, f"${result['total_cost']:.4f}")
+    console.print(table)
+
+    if show_outputs:
+        for result in results:
+            if result.get("output"):
+                name = composer.models.get(result["model"], {}).get("name", result["model"])
+                console.print(f"\n[bold cyan]{name}:[/bold cyan]")
+                console.print(composer.clean_output(result["output"]))
+
+
+def _fmt(value, template: str) -> str:
+    return template.format(value) if value is not None else "-"
+
+
+def render_summary(console: Console, composer, summary: list[dict]):
+    """Print per-model averages over all recorded comparisons."""
+    if not summary:
+        console.print("[warning]No model comparisons recorded yet.[/warning]")
+        return
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Type", style="cyan")
+    table.add_column("Model", style="cyan")
+    table.add_column("Runs", justify="right")
+    table.add_column("Errors", justify="right")
+    table.add_column("Avg latency", justify="right")
+    table.add_column("Avg first token", justify="right")
+    table.add_column("Avg out tokens", justify="right")
+    table.add_column("Avg cost", justify="right", style="green")
+    for row in summary:
+        name = composer.models.get(row["model"], {}).get("name", row["model"])
+        table.add_row(row["prompt_type"], name, str(row["runs"]), str(row["errors"]),
+                      _fmt(row["avg_latency_s"], "{:.2f}s"), _fmt(row["avg_ttft_s"], "{:.2f}s"),
+                      _fmt(row["avg_output_tokens"], "{:.0f}"), _fmt(row["avg_cost"], "${:.4f}"))
+    console.print(table)
+
+
+def compare_main(args):
+    """Entry point for `prompt-cli compare`."""
+    from cli.src.prompt_composer import PromptComposer
+
+    composer = PromptComposer(use_cache=False)
+    console = composer.console
+    if args.summary:
+        render_summary(console, composer, composer.history_handler.store.get_comparison_summary(args.type))
+        return 0
+
+    models = args.models.split(",") if args.models else list(composer.models)
+    unknown = [model for model in models if model not in composer.models]
+    if unknown:
+        console.print(f"[error]Unknown model(s): {', '.join(unknown)}. Choose from: {', '.join(composer.models)}[/error]")
+        return 1
+    with console.status(f"[bold green]Running {len(models)} models...[/bold green]"):
+        results = runtime.run(compare_models(composer, args.type, args.question, models))
+    render_comparison(console, composer, results, show_outputs=not args.no_outputs)
+    return 0 if not any(r.get("error") for r in results) else 2
@@ -0,0 +1,173 @@
+import os
+from datetime import date, timedelta
+from rich.console import Console
+from rich.table import Table
+from cli.src.utils import MODEL_PRICES, count_prompt_tokens, calculate_prompt_price
+
+# Output tokens assumed for a type with no billed history yet
+DEFAULT_OUTPUT_TOKENS = 600
+
+REFUSE = "refuse"
+DOWNGRADE = "downgrade"
+BUDGET_ACTIONS = (REFUSE, DOWNGRADE)
+
+# Budgets live in the history database's meta table; these environment variables override them
+BUDGET_ENV = {"daily": "PROMPT_CLI_DAILY_BUDGET", "monthly": "PROMPT_CLI_MONTHLY_BUDGET",
+              "action": "PROMPT_CLI_BUDGET_ACTION"}
+
+
+class BudgetExceeded(Exception):
+    """Raised before a model call that would take spend past a daily or monthly cap."""
+
+
+def _amount(value: str | None) -> float | None:
+    """A cap in dollars, or None for no cap (unset, 0 or unparsable)."""
+    try:
+        amount = float(value) if value else None
+    except ValueError:
+        return None
+    return amount if amount and amount > 0 else None
+
+
+def period_starts(today: date | None = None) -> dict[str, str]:
+    """First day (YYYY-MM-DD) of the current daily and monthly budget periods."""
+    today = today or date.today()
+    return {"daily": today.isoformat(), "monthly": today.replace(day=1).isoformat()}
+
+
+class BudgetGuard:
+    """Pre-flight spend check for model calls.
+
+    Before a call, its cost is estimated from the input tokens (the system
+    prompt count is memoized) and the average output of past billed
+    generations of the same type, then checked against what the cost ledger has recorded for
+    today and this month plus calls still in flight. If a cap would be
+    exceeded the call is refused, or with the "downgrade" action moved to the
+    most expensive cheaper model that still fits.
+    """
+
+    def __init__(self, store, models: list[str]):
+        self.store = store
+        self.models = models
+        # Estimates of calls that passed the check and have not been recorded
+        # yet. Calls only run on the shared event loop, so no lock is needed.
+        self._reserved = 0.0
+
+    def limits(self) -> dict:
+        """{"daily": cap or None, "monthly": cap or None, "action": refuse|downgrade}"""
+        settings = {key: os.getenv(env) or self.store.get_meta(f"budget_{key}") for key, env in BUDGET_ENV.items()}
+        action = settings["action"] if settings["action"] in BUDGET_ACTIONS else REFUSE
+        return {"daily": _amount(settings["daily"]), "monthly": _amount(settings["monthly"]), "action": action}
+
+    def set_limits(self, daily: float | None = None, monthly: float | None = None, action: str | None = None):
+        """Store budget settings; a cap of 0 removes it."""
+        with self.store.conn:
+            for key, value in (("daily", daily), ("monthly", monthly), ("action", action)):
+                if value is not None:
+                    self.store.set_meta(f"budget_{key}", str(value))
+
+    def spent(self) -> dict[str, float]:
+        """Recorded spend in the current daily and monthly periods."""
+        return {period: self.store.spend_since(start) for period, start in period_starts().items()}
+
+    def estimate(self, prompt_type: str, model: str, system_prompt: str, question: str) -> float:
+        """Estimated cost in dollars of one call."""
+        average = self.store.average_tokens(prompt_type, model) or self.store.average_tokens(prompt_type)
+        output_tokens = average[1] if average else DEFAULT_OUTPUT_TOKENS
+        # 0 means the tokenizer is unavailable; past calls of the type are the next best guess
+        input_tokens = count_prompt_tokens(system_prompt, question, model) or (average[0] if average else 0)
+        return calculate_prompt_price(round(input_tokens), round(output_tokens), model)["total_cost"]
+
+    def reserve(self, prompt_type: str, model: str, system_prompt: str, question: str,
+                allow_downgrade: bool = True) -> tuple[str, float]:
+        """Check a call against the caps; returns (model to use, reserved amount).
+
+        Raises BudgetExceeded if neither the model nor (when downgrading is
+        allowed and configured) any cheaper one fits, or if the model has no
+        known price. Pass the reserved amount to release() once the call's real
+        cost is recorded or it failed.
+        """
+        limits = self.limits()
+        if limits["daily"] is None and limits["monthly"] is None:
+            return model, 0.0
+        if model not in MODEL_PRICES:
+            raise BudgetExceeded(f"No price is known for {model}, so it cannot be checked against the budget")
+        spent = self.spent()
+        remaining = {period: limits[period] - spent[period] - self._reserved
+                     for period in ("daily", "monthly") if limits[period] is not None}
+        period = min(remaining, key=remaining.get)
+        headroom = remaining[period]
+
+        cost = self.estimate(prompt_type, model, system_prompt, question)
+        if cost <= headroom:
+            self._reserved += cost
+            return model, cost
+        if allow_downgrade and limits["action"] == DOWNGRADE:
+            fitting = [(estimate, other) for other in self.models if other != model and other in MODEL_PRICES
+                       for estimate in [self.estimate(prompt_type, other, system_prompt, question)]
+                       if estimate < cost and estimate <= headroom]
+            if fitting:
+                estimate, other = max(fitting)
+                self._reserved += estimate
+                return other, estimate
+        raise BudgetExceeded(
+            f"{period.capitalize()} budget of ${limits[period]:.2f} would be exceeded "
+            f"(${spent[period]:.4f} spent, ${max(headroom, 0.0):.4f} left, this call is estimated at ${cost:.4f})")
+
+    def release(self, amount: float):
+        self._reserved = max(0.0, self._reserved - amount)
+
+
+def render_costs(console: Console, rows: list[dict], group_by: str):
+    """Print spend rollups as a table with a total row."""
+    if not rows:
+        console.print("[warning]No spend recorded for this period.[/warning]")
+        return
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column({"day": "Day", "model": "Model", "type": "Type"}[group_by], style="cyan")
+    table.add_column("Generations", justify="right")
+    table.add_column("Tokens in", justify="right")
+    table.add_column("Tokens out", justify="right")
+    table.add_column("Cost", justify="right", style="green")
+    for row in rows:
+        table.add_row(row["key"], f"{row['generations']:,}", f"{row['input_tokens']:,}", f"{row['output_tokens']:,}",
+                      f"${row['total_cost']:.4f}")
+    table.add_section()
+    table.add_row("Total", f"{sum(r['generations'] for r in rows):,}", f"{sum(r['input_tokens'] for r in rows):,}",
+                  f"{sum(r['output_tokens'] for r in rows):,}", f"${sum(r['total_cost'] for r in rows):.4f}",
+                  style="bold")
+    console.print(table)
+
+
+def render_budget(console: Console, guard: BudgetGuard):
+    """One line per budget period: spent so far against its cap."""
+    limits = guard.limits()
+    spent = guard.spent()
+    for period, label in (("daily", "Today"), ("monthly", "This month")):
+        if limits[period] is None:
+            console.print(f"[dim]{label}: ${spent[period]:.4f} spent (no {period} budget)[/dim]")
+        else:
+            share = spent[period] / limits[period] * 100
+            style = "error" if share >= 100 else "warning" if share >= 80 else "info"
+            console.print(f"[{style}]{label}: ${spent[period]:.4f} of ${limits[period]:.2f} "
+                          f"{period} budget ({share:.0f}%)[/{style}]")
+    if limits["daily"] is not None or limits["monthly"] is not None:
+        console.print(f"[dim]Over budget: {limits['action']}[/dim]")
+
+
+def costs_main(args):
+    """Entry point for `prompt-cli costs`."""
+    from cli.src.history import PromptHistory
+
+    history = PromptHistory()
+    console = history.console
+    guard = BudgetGuard(history.store, [])
+    if args.daily_budget is not None or args.monthly_budget is not None or args.budget_action:
+        guard.set_limits(args.daily_budget, args.monthly_budget, args.budget_action)
+        console.print("[success]Budget settings saved.[/success]")
+
+    since = (date.today() - timedelta(days=args.days - 1)).isoformat() if args.days else None
+    rows = history.store.cost_rollups(args.by, since, args.type, args.model)
+    render_costs(console, rows, args.by)
+    render_budget(console, guard)
+    return 0
@@ -1,104 +1,182 @@
 import os
 import sys
 import subprocess
-import re
-import json
-from datetime import datetime
-import questionary
-from questionary import Style as QuestionaryStyle, Choice
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from rich.panel import Panel
 from rich.theme import Theme
 from rich.table import Table
 from rich.prompt import Prompt
 from cli.src.utils import count_tokens, calculate_prompt_price, copy_to_clipboard
+from cli.src.history_store import HistoryStore
+from cli.src.segment_log import SegmentLog
+from cli.src.profiling import timed
+from cli.src.output_parser import parse_output, parse_param_filters, format_param_filters, EXTRA_NEWLINES_RE
+
+# Syncs that read fewer files than this finish too quickly to need a progress bar
+PROGRESS_MIN_FILES = 500
 
 class PromptHistory:
     def __init__(self):
         self.output_dir = os.path.join(os.path.expanduser('~'), '.prompt-cli', 'output')
         self.console = Console(theme=Theme({"info": "cyan", "warning": "yellow", "error": "bold red", "success": "bold green"}))
         self.page_size = 10
+        self._prefetcher: ThreadPoolExecutor | None = None
+        self.store = HistoryStore(output_dir=self.output_dir)
+        self.log = SegmentLog()
+        # Index new, changed or deleted JSON files written by older versions
+        self.sync_json_files()
+        # Pick up log records written by other sessions (or not indexed before a crash)
+        self.store.index_log(self.log)
+        if not self.store.get_meta("parsed_backfill_done"):
+            with self.console.status("[bold green]Parsing saved outputs (one time)...[/bold green]"):
+                self.store.backfill_parsed()
+        # Spend of entries saved before the cost ledger existed
+        self.store.build_cost_ledger()
+
+    def sync_json_files(self, force: bool = False, workers: int | None = None, processes: bool = False) -> dict:
+        """Sync legacy JSON history files, with a progress bar when there are many to read."""
+        progress_bar = None
+
+        def on_progress(done: int, total: int):
+            nonlocal progress_bar
+            if progress_bar is None:
+                if total < PROGRESS_MIN_FILES:
+                    return
+                from rich.progress import Progress
+                progress_bar = Progress(console=self.console, transient=True)
+                progress_bar.add_task("Indexing history files", total=total)
+                progress_bar.start()
+            progress_bar.update(progress_bar.task_ids[0], completed=done)
 
-    def get_history(self, prompt_type: str, search_term: str | None = None) -> list[dict]:
-        """Get history of prompts for a specific type from JSON files."""
-        type_dir = os.path.join(self.output_dir, prompt_type)
-
-        if not os.path.exists(type_dir):
+        try:
+            return self.store.sync_json_files(force, workers, processes, progress=on_progress)
+        finally:
+            if progress_bar is not None:
+                progress_bar.stop()
+
+    def save_entry(self, data: dict) -> str:
+        """Append a generation to the history log and return its locator."""
+        return self.store.append_entry(self.log, data)
+
+    @timed("history.get_history")
+    def get_history(self, prompt_type: str, search_term: str | None = None,
+                    limit: int | None = None, offset: int = 0,
+                    param_filters: list[tuple[str, str | None]] | None = None) -> list[dict]:
+        """Get history of prompts for a specific type from the history store, newest first."""
+        try:
+            return self.store.get_entries(prompt_type, search_term, limit=limit, offset=offset,
+                                          param_filters=param_filters)
+        except Exception as e:
+            self.console.print(f"[error]Error reading history for {prompt_type}: {str(e)}[/error]")
             return []
 
-        history_items = []
+    @timed("history.page")
+    def get_page(self, prompt_type: str, search_term: str | None = None, after: tuple[str, int] | None = None,
+                 offset: int = 0, limit: int | None = None,
+                 param_filters: list[tuple[str, str | None]] | None = None) -> list[dict]:
+        """Get listing metadata (no outputs) for one page of history; see HistoryStore.get_page."""
         try:
-            # Get all JSON files
-            files = [f for f in os.listdir(type_dir) if f.endswith('.json')]
-            # Sort files based on timestamp embedded in filename (assuming format type_YYYYMMDD_HHMMSS_...)
-            # This avoids reading file contents just for sorting
-            files.sort(reverse=True) # Simple reverse alphabetical sort often works for timestamps
+            return self.store.get_page(prompt_type, search_term, limit=limit or self.page_size, after=after, offset=offset,
+                                       param_filters=param_filters)
         except Exception as e:
-            self.console.print(f"[error]Error listing or sorting directory {type_dir}: {str(e)}[/error]")
+            self.console.print(f"[error]Error reading history for {prompt_type}: {str(e)}[/error]")
             return []
 
-        for file in files:
-            file_path = os.path.join(type_dir, file)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-
-                # Validate essential fields
-                if not all(k in data for k in ["question", "output", "timestamp_iso"]):
-                     self.console.print(f"[warning]Skipping malformed history file: {file} (missing essential fields)[/warning]")
-                     continue
-
-                # Filter by search term (search in question/prompt)
-                if search_term and search_term.lower() not in data.get("question", "").lower():
-                    continue
-
-                # Parse timestamp
-                timestamp = None
-                try:
-                    timestamp = datetime.fromisoformat(data["timestamp_iso"])
-                except (ValueError, TypeError):
-                    self.console.print(f"[warning]Could not parse timestamp in file: {file}[/warning]")
-                    pass # Keep timestamp as None
-
-                # Add filename and path for reference
-                data['file'] = file
-                data['path'] = file_path
-                data['timestamp'] = timestamp # Add the parsed datetime object
-
-                history_items.append(data)
-
-            except json.JSONDecodeError:
-                self.console.print(f"[warning]Skipping corrupted JSON history file: {file}[/warning]")
-            except Exception as e:
-                self.console.print(f"[error]Error reading history file {file}: {str(e)}[/error]")
-
-        # Re-sort based on parsed timestamp object for accuracy (if needed, file sort might be sufficient)
-        history_items.sort(key=lambda x: x.get('timestamp') or datetime.min, reverse=True)
+    def prefetch_page(self, prompt_type: str, search_term: str | None, after: tuple[str, int] | None, offset: int,
+                      param_filters: list[tuple[str, str | None]] | None = None):
+        """Start loading a page in the background; returns a future for get_page's result."""
+        if self._prefetcher is None:
+            self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-prefetch")
+        # One extra row tells the browser whether a further page exists
+        return self._prefetcher.submit(self.get_page, prompt_type, search_term, after, offset, self.page_size + 1,
+                                       param_filters)
+
+    @timed("history.load_entry")
+    def load_entry(self, item: dict) -> dict:
+        """Load the full entry (with its output) for a listing row."""
+        return self.store.get_entry(item['id']) or item
+
+    def count_history(self, prompt_type: str, search_term: str | None = None,
+                      param_filters: list[tuple[str, str | None]] | None = None) -> int:
+        """Count history entries for a prompt type without loading them."""
+        try:
+            return self.store.count(prompt_type, search_term, param_filters)
+        except Exception as e:
+            self.console.print(f"[error]Error counting history for {prompt_type}: {str(e)}[/error]")
+            return 0
+
+    @staticmethod
+    def filter_label(search_term: str | None, param_filters: list[tuple[str, str | None]] | None) -> str:
+        """Describe the active search and parameter filters, e.g. " (filtered: 'space', --sref 123)"."""
+        parts = ([f"'{search_term}'"] if search_term else []) + ([format_param_filters(param_filters)] if param_filters else [])
+        return f" (filtered: {', '.join(parts)})" if parts else ""
+
+    def display_history(self, prompt_type: str, limit: int = 10, search_term: str | None = None,
+                        param_filters: list[tuple[str, str | None]] | None = None):
+        """Print a table of the most recent (or best matching) prompts (non-interactive)."""
+        # One extra row tells whether there is more than the table shows, without counting every match
+        history = self.get_page(prompt_type, search_term, limit=limit + 1, param_filters=param_filters)
+        more = len(history) > limit
+        history = history[:limit]
+        if not history:
+            if search_term or param_filters:
+                self.console.print(f"[warning]No {prompt_type} history matches{self.filter_label(search_term, param_filters)}[/warning]")
+            else:
+                self.console.print(f"[warning]No history found for {prompt_type}[/warning]")
+            return
 
-        return history_items
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("#", style="dim", width=4, justify="right")
+        table.add_column("Date", style="cyan", width=16)
+        table.add_column("Prompt", style="green", no_wrap=False)
+        for idx, item in enumerate(history):
+            date_str = item['timestamp'].strftime("%Y-%m-%d %H:%M") if item.get('timestamp') else "Unknown Date"
+            table.add_row(str(idx + 1), date_str, item.get('question', '<No Prompt Found>'))
+        self.console.print(f"{prompt_type.capitalize()} History - {len(history)}{' most recent' if more and not search_term else ''} entries"
+                           + (" (more with --limit)" if more else "") + self.filter_label(search_term, param_filters), style="cyan")
+        self.console.print(table)
+
+    def interactive_history(self, prompt_type: str, search_term: str | None = None,
+                            param_filters: list[tuple[str, str | None]] | None = None):
+        """Interactive history browser (pages through the history store)."""
+        import questionary
+        from questionary import Style as QuestionaryStyle, Choice
 
-    def interactive_history(self, prompt_type: str):
-        """Interactive history browser (reads JSON)."""
         page = 0
-        search_term = None
-        history = self.get_history(prompt_type, search_term)
-
-        if not history:
-            self.console.print(f"[warning]No history found for {prompt_type}[/warning]")
-            return
 
         # Define action constants
         ACTION_NEXT = 'next_page'
         ACTION_PREV = 'prev_page'
         ACTION_SEARCH = 'search'
+        ACTION_PARAMS = 'filter_params'
         ACTION_RESET = 'reset_search'
         ACTION_BACK = 'back'
 
+        # Cursor each visited page starts after, and the page being prefetched as (page, future)
+        page_cursors = [None]
+        prefetched = None
+
         while True:
-            total_pages = (len(history) + self.page_size - 1) // self.page_size
             start_idx = page * self.page_size
-            end_idx = min(start_idx + self.page_size, len(history))
-            current_items = history[start_idx:end_idx]
+            # Only the visible page's metadata is read; the next one loads while this is shown
+            if prefetched and prefetched[0] == page:
+                page_items = prefetched[1].result()
+            else:
+                page_items = self.prefetch_page(prompt_type, search_term, page_cursors[page], start_idx,
+                                                param_filters).result()
+            has_next = len(page_items) > self.page_size
+            current_items = page_items[:self.page_size]
+            end_idx = start_idx + len(current_items)
+            if not current_items and not page and not search_term and not param_filters:
+                self.console.print(f"[warning]No history found for {prompt_type}[/warning]")
+                return
+            prefetched = None
+            if has_next:
+                del page_cursors[page + 1:]
+                page_cursors.append(current_items[-1]['cursor'])
+                prefetched = (page + 1, self.prefetch_page(prompt_type, search_term, page_cursors[page + 1],
+                                                           start_idx + self.page_size, param_filters))
 
             # --- REVISED: Prepare choices with actions first ---
             choices = []
@@ -112,11 +190,13 @@ class PromptHistory:
             action_choices = []
             if page > 0:
                 action_choices.append(Choice(title='[p] Previous page', value=ACTION_PREV))
-            if page < total_pages - 1:
+            if has_next:
                 action_choices.append(Choice(title='[n] Next page', value=ACTION_NEXT))
             action_choices.append(Choice(title='[s] Search prompts', value=ACTION_SEARCH))
-            if search_term:
-                 action_choices.append(Choice(title='[r] Reset search', value=ACTION_RESET))
+            if prompt_type == 'midjourney':
+                action_choices.append(Choice(title='[f] Filter by parameters (--sref, --ar, ...)', value=ACTION_PARAMS))
+            if search_term or param_filters:
+                 action_choices.append(Choice(title='[r] Reset search and filters', value=ACTION_RESET))
             action_choices.append(Choice(title='[b] Back to main menu', value=ACTION_BACK))
             choices.extend(action_choices)
 
@@ -131,14 +211,16 @@ class PromptHistory:
                     prompt_display = item.get('question', '<No Prompt Found>')
                     if len(prompt_display) > 70: # Adjust length as needed
                         prompt_display = prompt_display[:67] + "..."
-                    # Use the index as the value to easily retrieve the full item
-                    choices.append(Choice(title=f"{idx + 1}: {date_str} - {prompt_display}", value=idx))
+                    # Use the page-relative index as the value; the full entry is loaded when opened
+                    choices.append(Choice(title=f"{idx + 1}: {date_str} - {prompt_display}", value=i))
 
             # --- END REVISED CHOICES ---
 
             # Display the table (remains largely the same, uses 'question' field)
             self.console.clear()
-            self.console.print(f"{prompt_type.capitalize()} History - {start_idx + 1}-{end_idx} of {len(history)} entries" + (f" (filtered: '{search_term}')" if search_term else ""), style="cyan")
+            # Pages are read by keyset, so nothing counts every matching entry
+            self.console.print(f"{prompt_type.capitalize()} History - entries {start_idx + 1}-{end_idx}"
+                               + (", more on the next page" if has_next else "") + self.filter_label(search_term, param_filters), style="cyan")
             if current_items:
                 table = Table(show_header=True, header_style="bold magenta")
                 table.add_column("#", style="dim", width=4, justify="right")
@@ -166,17 +248,17 @@ class PromptHistory:
 
             # --- Handle selection ---
             if isinstance(selection, int): # User selected a history entry index
-                self.view_prompt_interactive(history[selection]) # Pass the full dictionary
+                self.view_prompt_interactive(self.load_entry(current_items[selection]))
                 # Loop continues after viewing
             elif selection == ACTION_BACK:
                 break
-            elif selection == ACTION_NEXT and page < total_pages - 1:
+            elif selection == ACTION_NEXT and has_next:
                 page += 1
             elif selection == ACTION_PREV and page > 0:
                 page -= 1
             elif selection == ACTION_SEARCH:
                 search_term_input = questionary.text(
-                    "Enter search term (leave blank to show all, Ctrl+C to cancel):",
+                    "Enter search terms, \"quoted phrases\" or prefixes* (leave blank to show all, Ctrl+C to cancel):",
                     style=custom_style
                 ).ask()
                 if search_term_input is None: # Handle Ctrl+C during search input
@@ -184,17 +266,33 @@ class PromptHistory:
                 search_term = search_term_input.strip()
                 if not search_term:
                     search_term = None
-                # Reset history and page when searching
-                history = self.get_history(prompt_type, search_term)
-                page = 0
+                # Start over from the first page when searching
+                page, page_cursors, prefetched = 0, [None], None
                 # No need for extra check here, loop will display empty message if needed
+            elif selection == ACTION_PARAMS:
+                filter_input = questionary.text(
+                    "Enter parameters to filter by, e.g. sref=3982906704 ar=16:9 (leave blank to clear, Ctrl+C to cancel):",
+                    style=custom_style
+                ).ask()
+                if filter_input is None: # Handle Ctrl+C during filter input
+                    continue
+                try:
+                    param_filters = parse_param_filters(filter_input) or None
+                except ValueError as e:
+                    self.console.print(f"[error]{str(e)}[/error]")
+                    self.console.input("Press Enter to continue...")
+                    continue
+                page, page_cursors, prefetched = 0, [None], None
             elif selection == ACTION_RESET:
                 search_term = None
-                history = self.get_history(prompt_type)
-                page = 0
+                param_filters = None
+                page, page_cursors, prefetched = 0, [None], None
 
     def view_prompt_interactive(self, item: dict):
         """View a specific prompt and its output from history data with interactive options."""
+        import questionary
+        from questionary import Style as QuestionaryStyle, Choice
+
         try:
             # Extract data using .get for safety
             prompt = item.get('question', '<Prompt not found>')
@@ -208,12 +306,10 @@ class PromptHistory:
             self.console.print("[bold cyan]Prompt:[/bold cyan]")
             self.console.print(prompt)
 
-            # Clean output for display (same logic as before)
-            display_output = re.sub(r'\*\*(.*?)\*\*', r'\1', output)
-            display_output = display_output.replace('*', '')
-
-            # Find variations (same logic as before)
-            variations = re.findall(r'^\s*(\d+)\.\s*(.*?)(?=\n\s*\d+\.|\n*$)', output, re.DOTALL | re.MULTILINE)
+            # Display text and variations were parsed when the entry was saved
+            parsed = item if item.get('display_output') is not None else parse_output(output)
+            display_output = parsed['display_output']
+            variations = parsed['variations']
 
             custom_style = QuestionaryStyle([
                 ('question', 'bold yellow'), ('answer', 'bold green'),
@@ -303,19 +399,18 @@ class PromptHistory:
             self.console.print(f"[error]Error displaying history item {item.get('file', '')}: {type(e).__name__} - {str(e)}[/error]", style="bold red")
             self.console.input("Press Enter to return to history list...")
 
-    def view_prompt(self, prompt_type: str, index: int):
-        """View a specific prompt and its output (non-interactive version, reads JSON)."""
-        history = self.get_history(prompt_type)
-
-        if not history:
-            self.console.print(f"[warning]No history found for {prompt_type}[/warning]")
+    def view_prompt(self, prompt_type: str, index: int, search_term: str | None = None,
+                    param_filters: list[tuple[str, str | None]] | None = None):
+        """View a specific prompt and its output (non-interactive version)."""
+        # Adjust index to be 1-based for user input, convert to 0-based offset
+        items = self.get_history(prompt_type, search_term, limit=1, offset=index - 1, param_filters=param_filters) if index >= 1 else []
+        if not items:
+            if index == 1:
+                self.console.print(f"[warning]No history found for {prompt_type}[/warning]")
+            else:
+                self.console.print(f"[error]Invalid history index: {index}. There is no entry {index} in this history.[/error]")
             return
-
-        # Adjust index to be 1-based for user input, convert to 0-based for list access
-        if index < 1 or index > len(history):
-             self.console.print(f"[error]Invalid history index: {index}. Please use a number between 1 and {len(history)}.[/error]")
-             return
-        item = history[index - 1] # Use 0-based index
+        item = items[0]
 
         try:
             # Extract data using .get for safety
@@ -328,9 +423,10 @@ class PromptHistory:
             # Display the prompt and output (using cleaned output)
             self.console.print("[bold cyan]Prompt:[/bold cyan]")
             self.console.print(prompt)
-            display_output = re.sub(r'\*\*(.*?)\*\*', r'\1', output)
-            display_output = display_output.replace('*', '')
-            display_output = re.sub(r'\n{3,}', '\n\n', display_output) # Clean extra newlines
+            display_output = item.get('display_output')
+            if display_output is None:
+                display_output = parse_output(output)['display_output']
+            display_output = EXTRA_NEWLINES_RE.sub('\n\n', display_output) # Clean extra newlines
             self.console.print("[bold green]Output:[/bold green]")
             self.console.print(display_output.strip())
 
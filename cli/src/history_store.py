@@ -0,0 +1,963 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from cli.src.segment_log import CompactionIncomplete, format_locator, parse_locator
+from cli.src.output_parser import parse_output, parse_mj_params
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CLI_DIR = os.path.join(os.path.expanduser('~'), '.prompt-cli')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prompt_type TEXT NOT NULL,
+    model_used TEXT,
+    timestamp_iso TEXT NOT NULL,
+    question TEXT NOT NULL,
+    output TEXT NOT NULL,
+    cost_info TEXT,
+    file TEXT,
+    path TEXT UNIQUE,
+    segment TEXT,
+    seg_offset INTEGER,
+    seg_length INTEGER,
+    variations TEXT,
+    mj_params TEXT,
+    display_output TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_generations_type_ts ON generations (prompt_type, timestamp_iso DESC);
+CREATE INDEX IF NOT EXISTS idx_generations_ts ON generations (timestamp_iso DESC);
+CREATE INDEX IF NOT EXISTS idx_generations_model ON generations (model_used);
+CREATE INDEX IF NOT EXISTS idx_generations_listing ON generations (prompt_type, timestamp_iso DESC, id DESC, question, path);
+CREATE TABLE IF NOT EXISTS model_comparisons (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    prompt_type TEXT NOT NULL,
+    timestamp_iso TEXT NOT NULL,
+    question TEXT NOT NULL,
+    model TEXT NOT NULL,
+    latency_s REAL,
+    ttft_s REAL,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    total_cost REAL,
+    path TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_comparisons_type_model ON model_comparisons (prompt_type, model);
+CREATE TABLE IF NOT EXISTS json_files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    generation_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_json_files_dir ON json_files (dir);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    generation_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns added after the first release, with their types, for migrating older databases
+ADDED_COLUMNS = {"segment": "TEXT", "seg_offset": "INTEGER", "seg_length": "INTEGER", "variations": "TEXT",
+                 "mj_params": "TEXT", "display_output": "TEXT"}
+
+# Full-text index over question and output. External content keeps the text
+# stored once (in generations); the triggers keep the index in step on every write.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5 (
+    question, output,
+    content='generations', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS generations_fts_ai AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts (rowid, question, output) VALUES (new.id, new.question, new.output);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_fts_ad AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, question, output) VALUES ('delete', old.id, old.question, old.output);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_fts_au AFTER UPDATE OF question, output ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, question, output) VALUES ('delete', old.id, old.question, old.output);
+    INSERT INTO generations_fts (rowid, question, output) VALUES (new.id, new.question, new.output);
+END;
+"""
+
+# Secondary index over the Midjourney parameters stored with each entry
+# (mj_params JSON), one row per parameter value; flags without a value are
+# indexed with an empty value. Triggers keep it in step with generations.
+PARAMS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mj_params (
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    generation_id INTEGER NOT NULL,
+    PRIMARY KEY (name, value, generation_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_mj_params_generation ON mj_params (generation_id);
+CREATE TRIGGER IF NOT EXISTS generations_params_ai AFTER INSERT ON generations WHEN new.mj_params IS NOT NULL BEGIN
+    INSERT OR IGNORE INTO mj_params (name, value, generation_id)
+        SELECT p.key, COALESCE(v.value, ''), new.id FROM json_each(new.mj_params) AS p LEFT JOIN json_each(p.value) AS v;
+END;
+CREATE TRIGGER IF NOT EXISTS generations_params_ad AFTER DELETE ON generations BEGIN
+    DELETE FROM mj_params WHERE generation_id = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS generations_params_au AFTER UPDATE OF mj_params ON generations BEGIN
+    DELETE FROM mj_params WHERE generation_id = old.id;
+    INSERT OR IGNORE INTO mj_params (name, value, generation_id)
+        SELECT p.key, COALESCE(v.value, ''), new.id FROM json_each(new.mj_params) AS p LEFT JOIN json_each(p.value) AS v
+        WHERE new.mj_params IS NOT NULL;
+END;
+"""
+# Bumped when parse_mj_params changes, so stored parameters are parsed again once
+MJ_PARAMS_VERSION = "2"
+
+# What every billed generation cost, one row per model call. Cached responses
+# are not billed and never reach the ledger. The trigger folds each row into
+# per-day, per-type, per-model totals, so spend reports and budget checks
+# read a few rollup rows instead of every saved generation.
+COST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cost_ledger (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp_iso TEXT NOT NULL,
+    prompt_type TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    total_cost REAL NOT NULL,
+    usage_source TEXT
+);
+CREATE TABLE IF NOT EXISTS cost_rollups (
+    day TEXT NOT NULL,
+    prompt_type TEXT NOT NULL,
+    model TEXT NOT NULL,
+    generations INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    total_cost REAL NOT NULL,
+    PRIMARY KEY (day, prompt_type, model)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS cost_ledger_ai AFTER INSERT ON cost_ledger BEGIN
+    INSERT INTO cost_rollups (day, prompt_type, model, generations, input_tokens, output_tokens, total_cost)
+        VALUES (substr(new.timestamp_iso, 1, 10), new.prompt_type, new.model, 1,
+                new.input_tokens, new.output_tokens, new.total_cost)
+        ON CONFLICT (day, prompt_type, model) DO UPDATE SET
+            generations = generations + 1,
+            input_tokens = input_tokens + excluded.input_tokens,
+            output_tokens = output_tokens + excluded.output_tokens,
+            total_cost = total_cost + excluded.total_cost;
+END;
+"""
+
+# Columns cost_rollups() can group by
+COST_GROUPS = {"day": "day", "model": "model", "type": "prompt_type"}
+
+# bm25 column weights: matches in the question rank above matches in the output
+FTS_RANK = "bm25(generations_fts, 2.0, 1.0)"
+
+# Search syntax: "quoted phrases", bare terms (matched as prefixes) and an optional trailing *
+SEARCH_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+FTS_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_fts_query(search_term: str) -> str | None:
+    """Translate a user search string into a safe FTS5 MATCH expression.
+
+    Quoted text becomes a phrase query; every other word is matched as a prefix
+    so that "cat" still finds "cats", as the old substring search did. All
+    terms must match. Returns None if the search contains no searchable words.
+    """
+    parts = []
+    for match in SEARCH_TOKEN_RE.finditer(search_term):
+        phrase, term = match.groups()
+        if phrase is not None:
+            words = FTS_WORD_RE.findall(phrase)
+            if words:
+                parts.append('"' + " ".join(words) + '"')
+        else:
+            for word in FTS_WORD_RE.findall(term):
+                parts.append(f'"{word}"*')
+    return " AND ".join(parts) if parts else None
+
+
+# Files read per pool round trip while syncing legacy JSON history
+JSON_SYNC_CHUNK = 256
+
+
+def load_json_record(file_path: str) -> dict | None:
+    """Read one legacy JSON history file; None if it is unreadable or not a generation.
+
+    Module-level so process pools can pickle it.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None  # Corrupted or unreadable files are skipped, as before
+    if not isinstance(data, dict) or not all(k in data for k in ["question", "output", "timestamp_iso"]):
+        return None
+    return data
+
+
+# Plain-text outputs written by the first versions: "<question prefix>_YYYYMMDD_HHMMSS.txt"
+LEGACY_TEXT_RE = re.compile(r'^.*_(\d{8}_\d{6})\.txt$')
+
+
+def parse_legacy_text(file_path: str, prompt_type: str) -> dict | None:
+    """Parse a legacy "Prompt: ... Output: ..." text file into a history record.
+
+    The timestamp comes from the file name; the output is parsed for
+    variations and parameters like any other record. Returns None for files that do not follow the format.
+    """
+    match = LEGACY_TEXT_RE.match(os.path.basename(file_path))
+    if not match:
+        return None
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    except OSError:
+        return None
+    question, sep, output = text.partition("\nOutput:")
+    if not sep or not question.startswith("Prompt:"):
+        return None
+    question = question[len("Prompt:"):].strip()
+    return {
+        "prompt_type": prompt_type,
+        "model_used": None,  # Not recorded in the text format
+        "timestamp_iso": datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").isoformat(),
+        "question": question,
+        "output": output.strip(),
+        "cost_info": None,
+        **parse_output(output, question),
+    }
+
+
+# Fields parse_output() adds to a record
+PARSED_FIELDS = ("variations", "mj_params", "display_output")
+
+# Columns returned to callers, in the same shape the JSON files used to produce
+ENTRY_COLUMNS = ("id, prompt_type, model_used, timestamp_iso, question, output, cost_info, file, path, "
+                 "variations, mj_params, display_output")
+
+# Columns for history listings. idx_generations_listing covers them, so a page
+# is read from the index alone and output bodies are never loaded.
+LISTING_COLUMNS = "id, timestamp_iso, question, path"
+
+# Duplicates (same path or log locator) are skipped, so every import can be re-run safely
+INSERT_ENTRY = ("INSERT OR IGNORE INTO generations "
+                "(prompt_type, model_used, timestamp_iso, question, output, cost_info, file, path, "
+                "segment, seg_offset, seg_length, variations, mj_params, display_output) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+# Everything but the location, for entries whose record has moved since they were indexed
+UPDATE_ENTRY_CONTENT = ("UPDATE generations SET prompt_type = ?, model_used = ?, timestamp_iso = ?, question = ?, "
+                        "output = ?, cost_info = ?, variations = ?, mj_params = ?, display_output = ? WHERE id = ?")
+
+
+class HistoryStore:
+    """Indexed SQLite store for saved generations (~/.prompt-cli/history.db)."""
+
+    def __init__(self, db_path: str | None = None, output_dir: str | None = None):
+        self.db_path = db_path or os.path.join(PROMPT_CLI_DIR, 'history.db')
+        self.output_dir = output_dir or os.path.join(PROMPT_CLI_DIR, 'output')
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._owner = threading.current_thread()
+        self._local = threading.local()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.fts_enabled = self._init_fts()
+        self._init_params_index()
+        self.conn.executescript(COST_SCHEMA)
+        self.conn.commit()
+
+    def _migrate(self):
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(generations)")]
+        for column, column_type in ADDED_COLUMNS.items():
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE generations ADD COLUMN {column} {column_type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_segment ON generations (segment)")
+
+    def _init_params_index(self):
+        """Create the parameter index, building it once for entries parsed before it existed."""
+        self.conn.executescript(PARAMS_SCHEMA)
+        if self.get_meta("mj_params_version") != MJ_PARAMS_VERSION:
+            with self.conn:
+                # Entries parsed before question parameters counted (e.g. "nosferatu --sref 3982906704")
+                # or before every value of a flag did ("--sref 123 456")
+                rows = self.conn.execute("SELECT id, question, display_output FROM generations "
+                                         "WHERE display_output IS NOT NULL "
+                                         "AND (question LIKE '%--%' OR display_output LIKE '%--%')").fetchall()
+                self.conn.executemany(
+                    "UPDATE generations SET mj_params = ? WHERE id = ?",
+                    [(json.dumps(parse_mj_params(f"{row['question']}\n{row['display_output']}")), row["id"]) for row in rows])
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO mj_params (name, value, generation_id) "
+                    "SELECT p.key, COALESCE(v.value, ''), g.id FROM generations AS g, json_each(g.mj_params) AS p "
+                    "LEFT JOIN json_each(p.value) AS v WHERE g.mj_params IS NOT NULL")
+                self.set_meta("mj_params_version", MJ_PARAMS_VERSION)
+
+    def _init_fts(self) -> bool:
+        """Create the full-text index, building it once for pre-existing rows."""
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            return False  # SQLite built without FTS5; search falls back to LIKE
+        if not self.get_meta("fts_update_trigger_v2"):
+            # Older databases re-indexed on every update; now only text changes do
+            with self.conn:
+                self.conn.execute("DROP TRIGGER generations_fts_au")
+                self.conn.executescript(FTS_SCHEMA)
+                self.set_meta("fts_update_trigger_v2", datetime.now().isoformat())
+        if not self.get_meta("fts_built"):
+            with self.conn:
+                self.conn.execute("INSERT INTO generations_fts (generations_fts) VALUES ('rebuild')")
+                self.set_meta("fts_built", datetime.now().isoformat())
+        return True
+
+    def close(self):
+        self.conn.close()
+
+    def _read_conn(self) -> sqlite3.Connection:
+        """Connection for reads on the calling thread.
+
+        Background readers (page prefetch) get a connection of their own, so
+        they never share a cursor with the foreground; WAL lets both read at once.
+        """
+        if threading.current_thread() is self._owner:
+            return self.conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # --- Meta helpers ---
+
+    def get_meta(self, key: str) -> str | None:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- Writes ---
+
+    @staticmethod
+    def _entry_params(data: dict, path: str | None, location: tuple[str, int, int] | None = None) -> tuple:
+        # Records saved before outputs were parsed at save time are parsed on the way in
+        parsed = data if all(k in data for k in PARSED_FIELDS) else parse_output(data["output"], data["question"])
+        return (
+            data["prompt_type"],
+            data.get("model_used"),
+            data["timestamp_iso"],
+            data["question"],
+            data["output"],
+            json.dumps(data.get("cost_info")) if data.get("cost_info") is not None else None,
+            os.path.basename(path) if path else None,
+            path,
+            *(location or (None, None, None)),
+            json.dumps(parsed["variations"]),
+            json.dumps(parsed["mj_params"]),
+            parsed["display_output"],
+        )
+
+    def add_entry(self, data: dict, path: str | None = None, location: tuple[str, int, int] | None = None) -> int:
+        """Insert a single generation record and return its row id.
+
+        `location` is the record's (segment, offset, length) in the segment log.
+        """
+        with self.conn:
+            cursor = self.conn.execute(INSERT_ENTRY, self._entry_params(data, path, location))
+        return cursor.lastrowid
+
+    def append_entry(self, log, data: dict) -> str:
+        """Append a generation to the segment log, index it, and return its locator."""
+        location = log.append(data["prompt_type"], data)
+        locator = format_locator(location[0], location[1])
+        self.add_entry(data, locator, location)
+        return locator
+
+    def index_log(self, log) -> int:
+        """Index records appended to the segment log that the store has not seen yet.
+
+        Reads each segment only from the end of its last indexed record, so
+        this is cheap when nothing is new. Also finishes a compaction that
+        committed but was interrupted before its segments were swapped in; a
+        type whose compaction cannot be finished is not indexed until it is
+        compacted again. Returns the number of records indexed.
+        """
+        unfinished = set()
+        for (key,) in self.conn.execute("SELECT key FROM meta WHERE key LIKE 'compaction:%'").fetchall():
+            prompt_type = key.partition(':')[2]
+            with log.locked(prompt_type):
+                value = self.get_meta(key)  # Re-read: another process may have finished it meanwhile
+                if value is None:
+                    continue
+                pending = json.loads(value)
+                try:
+                    log.finish_compaction(pending["old"], pending["temp"])
+                except CompactionIncomplete as e:
+                    # The index points at the lost segments and the old ones are still there;
+                    # indexing them again would duplicate every entry
+                    logger.warning(f"{prompt_type}: {e}; run `prompt-cli compact --type {prompt_type}` to rebuild it")
+                    unfinished.add(prompt_type)
+                    continue
+                with self.conn:
+                    self.conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+
+        indexed_to = dict(self.conn.execute(
+            "SELECT segment, MAX(seg_offset + seg_length) FROM generations WHERE segment IS NOT NULL GROUP BY segment"
+        ).fetchall())
+        rows = []
+        for prompt_type in log.prompt_types():
+            if prompt_type in unfinished:
+                continue
+            for segment_path, offset, length, record in log.iter_records(prompt_type, indexed_to):
+                if not all(k in record for k in ["question", "output", "timestamp_iso"]):
+                    continue
+                record.setdefault("prompt_type", prompt_type)
+                rows.append(self._entry_params(record, format_locator(segment_path, offset),
+                                               (segment_path, offset, length)))
+        if rows:
+            with self.conn:
+                self.conn.executemany(INSERT_ENTRY, rows)
+        return len(rows)
+
+    def compact_log(self, log, prompt_type: str, remove_json: bool = True) -> dict:
+        """Rewrite every stored generation of a type into fresh, densely packed segments.
+
+        Drops damaged lines and records no longer in the store, and folds
+        generations still kept as legacy one-per-file JSON into the log,
+        deleting those files unless `remove_json` is False. The index switch
+        to the new segments is committed in one transaction; index_log()
+        completes the file swap if the process dies right after it.
+        """
+        with log.locked(prompt_type):
+            log.discard_incomplete(prompt_type)
+            ids, json_files = [], []
+
+            def records():
+                for row in self.conn.execute(
+                        "SELECT id, prompt_type, model_used, timestamp_iso, question, output, cost_info, path, "
+                        "variations, mj_params, display_output "
+                        "FROM generations WHERE prompt_type = ? ORDER BY timestamp_iso, id", (prompt_type,)):
+                    entry = dict(row)
+                    ids.append(entry.pop("id"))
+                    path = entry.pop("path")
+                    if path and path.endswith('.json') and parse_locator(path) is None:
+                        json_files.append((path, ids[-1]))
+                    entry["cost_info"] = json.loads(entry["cost_info"]) if entry["cost_info"] else None
+                    if entry["display_output"] is None:
+                        entry.update(parse_output(entry["output"], entry["question"]))  # Entry from before parsing at save time
+                    else:
+                        entry["variations"] = json.loads(entry["variations"])
+                        entry["mj_params"] = json.loads(entry["mj_params"])
+                    yield entry
+
+            bytes_before = sum(os.path.getsize(p) for p in log.segments(prompt_type))
+            old_segments, temp_files, locations = log.write_compacted(prompt_type, records())
+            pending_key = f"compaction:{prompt_type}"
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE generations SET path = ?, file = ?, segment = ?, seg_offset = ?, seg_length = ? "
+                    "WHERE id = ?",
+                    [(format_locator(segment, offset), os.path.basename(format_locator(segment, offset)),
+                      segment, offset, length, row_id)
+                     for row_id, (segment, offset, length) in zip(ids, locations)]
+                )
+                self.set_meta(pending_key, json.dumps({"old": old_segments, "temp": temp_files}))
+            log.finish_compaction(old_segments, temp_files)
+            with self.conn:
+                self.conn.execute("DELETE FROM meta WHERE key = ?", (pending_key,))
+
+        removed = 0
+        with self.conn:
+            for path, row_id in json_files:
+                if remove_json:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass  # Already gone or not ours to delete
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    self.conn.execute("DELETE FROM json_files WHERE path = ?", (path,))
+                    continue
+                # A kept file stays tied to its entry, so a later sync or reindex updates it instead of adding a copy
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO json_files (path, dir, mtime_ns, size, inode, generation_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, os.path.dirname(path), stat.st_mtime_ns, stat.st_size, stat.st_ino, row_id))
+        return {
+            "records": len(ids),
+            "segments_before": len(old_segments),
+            "segments_after": len(temp_files),
+            "bytes_before": bytes_before,
+            "bytes_after": sum(os.path.getsize(p) for p in log.segments(prompt_type)),
+            "json_files_folded": len(json_files),
+            "json_files_removed": removed,
+        }
+
+    def sync_json_files(self, force: bool = False, workers: int | None = None, processes: bool = False,
+                        progress=None) -> dict:
+        """Bring the store in line with the legacy one-file-per-generation JSON history.
+
+        Each file's (mtime, size, inode) is kept in json_files, so only new or
+        changed files are parsed, and entries of deleted files are dropped.
+        Every known file is stat'ed on each sync, but a type directory whose own
+        mtime and inode are unchanged since the last sync has had no files
+        added, removed or replaced and is not listed again; `force` re-lists
+        and re-parses everything.
+
+        Files are read by a pool of `workers` threads (or processes, which
+        also parse in parallel) in chunks, and entries are inserted in
+        directory and file-name order, so ids do not depend on scheduling.
+        `progress(done, total)` is called after each chunk. An interrupted sync
+        resumes where it stopped. Returns counts of added, updated and removed entries.
+        """
+        stats = {"added": 0, "updated": 0, "removed": 0}
+        type_dirs = set(row[0] for row in self.conn.execute("SELECT DISTINCT dir FROM json_files"))
+        if os.path.isdir(self.output_dir):
+            type_dirs.update(entry.path for entry in os.scandir(self.output_dir) if entry.is_dir())
+        scans = [scan for scan in (self._scan_json_dir(d, force) for d in sorted(type_dirs)) if scan]
+        total = sum(len(scan["changed"]) for scan in scans)
+        if total:
+            if processes:
+                from concurrent.futures import ProcessPoolExecutor  # Pulls in multiprocessing; only on request
+                pool = ProcessPoolExecutor(max_workers=workers)
+            else:
+                # Reads are I/O-latency bound (e.g. NFS homes), so use more threads than cores
+                pool = ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4))
+        done = 0
+        try:
+            for scan in scans:
+                changed = scan["changed"]
+                # Chunking bounds memory: at most one chunk of parsed files is held at a time
+                for i in range(0, len(changed), JSON_SYNC_CHUNK):
+                    chunk = changed[i:i + JSON_SYNC_CHUNK]
+                    records = pool.map(load_json_record, [path for path, _, _ in chunk])
+                    with self.conn:
+                        for (path, file_sig, previous), data in zip(chunk, records):
+                            self._apply_json_file(scan["dir"], path, file_sig, previous, data, stats)
+                    done += len(chunk)
+                    if progress:
+                        progress(done, total)
+                with self.conn:
+                    for path, generation_id in scan["removed"]:
+                        stats["removed"] += self._drop_file_entry(path, generation_id)
+                        self.conn.execute("DELETE FROM json_files WHERE path = ?", (path,))
+                    if scan["signature"]:
+                        self.set_meta(scan["meta_key"], scan["signature"])
+                    else:
+                        self.conn.execute("DELETE FROM meta WHERE key = ?", (scan["meta_key"],))
+        finally:
+            if total:
+                pool.shutdown()
+        return stats
+
+    def _scan_json_dir(self, type_dir: str, force: bool) -> dict | None:
+        """Work out which files of a type directory changed; None if none did.
+
+        Every known file is stat'ed, since rewriting a file in place leaves the
+        directory's mtime alone; the directory is only listed again if its own
+        signature changed.
+        """
+        try:
+            dir_stat = os.stat(type_dir)
+        except OSError:
+            dir_stat = None  # Directory removed: every file in it is gone
+        meta_key = f"json_dir:{type_dir}"
+        signature = f"{dir_stat.st_mtime_ns}:{dir_stat.st_ino}" if dir_stat else None
+        unlisted = bool(signature) and not force and self.get_meta(meta_key) == signature
+
+        known = {row[0]: tuple(row[1:]) for row in self.conn.execute(
+            "SELECT path, mtime_ns, size, inode, generation_id FROM json_files WHERE dir = ?", (type_dir,))}
+        if unlisted:
+            # No files were added, removed or replaced since the last sync
+            files = []
+            for path in sorted(known):
+                try:
+                    files.append((path, os.stat(path)))
+                except OSError:
+                    pass  # Gone after all; reported as removed below
+        else:
+            entries = sorted(os.scandir(type_dir), key=lambda e: e.name) if dir_stat else []
+            files = [(entry.path, entry.stat()) for entry in entries
+                     if entry.name.endswith('.json') and entry.is_file()]
+        changed, seen = [], set()
+        for path, stat in files:
+            seen.add(path)
+            file_sig = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            previous = known.get(path)
+            if previous and previous[:3] == file_sig and not force:
+                continue
+            changed.append((path, file_sig, previous))
+        removed = [(path, known[path][3]) for path in sorted(known.keys() - seen)]
+        if unlisted and not changed and not removed:
+            return None
+        return {"dir": type_dir, "meta_key": meta_key, "signature": signature, "changed": changed, "removed": removed}
+
+    def _apply_json_file(self, type_dir: str, file_path: str, file_sig: tuple, previous: tuple | None,
+                         data: dict | None, stats: dict):
+        generation_id = previous[3] if previous else None
+        if data is None:
+            if previous:
+                self._drop_file_entry(file_path, generation_id)
+            generation_id = None
+        else:
+            data.setdefault("prompt_type", os.path.basename(type_dir))
+            params = self._entry_params(data, file_path)
+            # A known entry is updated in place wherever it lives now: compaction
+            # moves entries into the segment log without forgetting their file
+            if generation_id is None or not self.conn.execute(UPDATE_ENTRY_CONTENT, (
+                    *params[:6], *params[11:], generation_id)).rowcount:
+                self.conn.execute(INSERT_ENTRY, params)
+                # The entry may already exist (imported by an earlier version); either way find its id
+                generation_id = self.conn.execute("SELECT id FROM generations WHERE path = ?", (file_path,)).fetchone()[0]
+            stats["updated" if previous else "added"] += 1
+        # Unreadable files are recorded too, so they are not re-parsed until they change
+        self.conn.execute(
+            "INSERT OR REPLACE INTO json_files (path, dir, mtime_ns, size, inode, generation_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)", (file_path, type_dir, *file_sig, generation_id))
+
+    def _drop_file_entry(self, file_path: str, generation_id: int | None) -> int:
+        # Only while the entry still points at the file: once compaction has
+        # moved it into the segment log, the log copy is kept.
+        if generation_id is None:
+            return 0
+        return self.conn.execute("DELETE FROM generations WHERE id = ? AND path = ?",
+                                 (generation_id, file_path)).rowcount
+
+    def import_legacy_text(self, root_dir: str, batch_size: int = 500, progress=None) -> dict:
+        """Import legacy .txt outputs from `root_dir/<prompt_type>/` into the store.
+
+        Files are streamed from the directory listing and written in batches,
+        one transaction each. Every imported file is recorded in imported_files
+        (by mtime and size) in the same transaction as its entry, so re-running
+        skips what is already there and an interrupted import resumes where it
+        stopped. `progress(done)` is called after each batch. Returns counts of
+        imported, skipped (already imported) and unparsable files.
+        """
+        stats = {"imported": 0, "skipped": 0, "invalid": 0}
+        if not os.path.isdir(root_dir):
+            return stats
+        batch = []
+        for type_entry in sorted(os.scandir(root_dir), key=lambda e: e.name):
+            if not type_entry.is_dir():
+                continue
+            for entry in os.scandir(type_entry.path):
+                if not entry.name.endswith('.txt') or not entry.is_file():
+                    continue
+                batch.append((entry.path, type_entry.name, entry.stat()))
+                if len(batch) >= batch_size:
+                    self._import_legacy_batch(batch, stats)
+                    batch = []
+                    if progress:
+                        progress(sum(stats.values()))
+        if batch:
+            self._import_legacy_batch(batch, stats)
+            if progress:
+                progress(sum(stats.values()))
+        return stats
+
+    def _import_legacy_batch(self, batch: list, stats: dict):
+        paths = [path for path, _, _ in batch]
+        known = {row[0]: tuple(row[1:]) for row in self.conn.execute(
+            "SELECT path, mtime_ns, size, generation_id FROM imported_files "
+            f"WHERE path IN ({', '.join('?' * len(paths))})", paths)}
+        with self.conn:
+            for path, prompt_type, stat in batch:
+                previous = known.get(path)
+                if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+                    stats["skipped"] += 1
+                    continue
+                if previous:
+                    self._drop_file_entry(path, previous[2])  # Changed since it was imported
+                data = parse_legacy_text(path, prompt_type)
+                generation_id = None
+                if data is None:
+                    stats["invalid"] += 1
+                else:
+                    self.conn.execute(INSERT_ENTRY, self._entry_params(data, path))
+                    row = self.conn.execute("SELECT id FROM generations WHERE path = ?", (path,)).fetchone()
+                    generation_id = row[0] if row else None
+                    stats["imported"] += 1
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO imported_files (path, mtime_ns, size, generation_id) VALUES (?, ?, ?, ?)",
+                    (path, stat.st_mtime_ns, stat.st_size, generation_id))
+
+    def backfill_parsed(self, batch_size: int = 1000) -> int:
+        """Parse entries stored before outputs were parsed at save time (runs once).
+
+        Stores their variations, Midjourney parameters and display text in
+        batches; returns the number of entries updated.
+        """
+        if self.get_meta("parsed_backfill_done"):
+            return 0
+        updated = 0
+        last_id = 0
+        while True:
+            rows = self.conn.execute(
+                "SELECT id, question, output FROM generations WHERE id > ? AND display_output IS NULL ORDER BY id LIMIT ?",
+                (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE generations SET variations = ?, mj_params = ?, display_output = ? WHERE id = ?",
+                    [(json.dumps(p["variations"]), json.dumps(p["mj_params"]), p["display_output"], row["id"])
+                     for row, p in ((row, parse_output(row["output"], row["question"])) for row in rows)])
+            updated += len(rows)
+            last_id = rows[-1]["id"]
+        with self.conn:
+            self.set_meta("parsed_backfill_done", datetime.now().isoformat())
+        return updated
+
+    def build_cost_ledger(self) -> int:
+        """Fill the cost ledger from the cost_info of entries saved before it existed (runs once).
+
+        Cached entries were not billed and are left out. Returns the number of entries added.
+        """
+        if self.get_meta("cost_ledger_built"):
+            return 0
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO cost_ledger (timestamp_iso, prompt_type, model, input_tokens, output_tokens, "
+                "total_cost, usage_source) "
+                "SELECT timestamp_iso, prompt_type, COALESCE(model_used, 'unknown'), "
+                "COALESCE(json_extract(cost_info, '$.input_tokens'), 0), "
+                "COALESCE(json_extract(cost_info, '$.output_tokens'), 0), json_extract(cost_info, '$.total_cost'), "
+                "json_extract(cost_info, '$.usage_source') "
+                "FROM generations WHERE json_valid(cost_info) AND json_extract(cost_info, '$.total_cost') IS NOT NULL "
+                "AND NOT COALESCE(json_extract(cost_info, '$.cached'), 0) ORDER BY timestamp_iso, id")
+            self.set_meta("cost_ledger_built", datetime.now().isoformat())
+        return cursor.rowcount
+
+    def record_cost(self, prompt_type: str, model: str, price_info: dict, timestamp_iso: str | None = None):
+        """Add one billed model call to the cost ledger (and its rollups)."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO cost_ledger (timestamp_iso, prompt_type, model, input_tokens, output_tokens, "
+                "total_cost, usage_source) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (timestamp_iso or datetime.now().isoformat(), prompt_type, model, price_info["input_tokens"],
+                 price_info["output_tokens"], price_info["total_cost"], price_info.get("usage_source")))
+
+    def cost_rollups(self, group_by: str = "day", since: str | None = None, prompt_type: str | None = None,
+                     model: str | None = None) -> list[dict]:
+        """Spend totals grouped by day, model or type, from `since` (YYYY-MM-DD) on.
+
+        Rows have the group key as "key" plus generations, input_tokens,
+        output_tokens and total_cost; days are newest first, the rest by spend.
+        """
+        column = COST_GROUPS[group_by]
+        clauses, params = [], []
+        for clause, value in (("day >= ?", since), ("prompt_type = ?", prompt_type), ("model = ?", model)):
+            if value:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "key DESC" if group_by == "day" else "total_cost DESC"
+        rows = self._read_conn().execute(
+            f"SELECT {column} AS key, SUM(generations) AS generations, SUM(input_tokens) AS input_tokens, "
+            f"SUM(output_tokens) AS output_tokens, SUM(total_cost) AS total_cost "
+            f"FROM cost_rollups {where} GROUP BY {column} ORDER BY {order}", params)
+        return [dict(row) for row in rows]
+
+    def spend_since(self, day: str) -> float:
+        """Total spend from `day` (YYYY-MM-DD) on."""
+        row = self._read_conn().execute("SELECT SUM(total_cost) FROM cost_rollups WHERE day >= ?", (day,)).fetchone()
+        return row[0] or 0.0
+
+    def average_tokens(self, prompt_type: str, model: str | None = None) -> tuple[float, float] | None:
+        """Mean billed (input, output) tokens per generation of a type (and model), or None without history."""
+        where, params = "prompt_type = ? AND output_tokens > 0", [prompt_type]
+        if model:
+            where += " AND model = ?"
+            params.append(model)
+        row = self._read_conn().execute(
+            f"SELECT SUM(input_tokens), SUM(output_tokens), SUM(generations) FROM cost_rollups WHERE {where}",
+            params).fetchone()
+        return (row[0] / row[2], row[1] / row[2]) if row[2] else None
+
+    def add_comparison(self, run_id: str, prompt_type: str, timestamp_iso: str, question: str, results: list[dict]):
+        """Record one model comparison run (one row per model)."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO model_comparisons "
+                "(run_id, prompt_type, timestamp_iso, question, model, latency_s, ttft_s, input_tokens, "
+                "output_tokens, total_cost, path, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, prompt_type, timestamp_iso, question, r["model"], r.get("latency_s"), r.get("ttft_s"),
+                  r.get("input_tokens"), r.get("output_tokens"), r.get("total_cost"), r.get("path"),
+                  r.get("error")) for r in results]
+            )
+
+    def get_comparison_summary(self, prompt_type: str | None = None) -> list[dict]:
+        """Per-model averages over all recorded comparisons, optionally for one prompt type."""
+        where, params = ("WHERE prompt_type = ?", [prompt_type]) if prompt_type else ("", [])
+        rows = self.conn.execute(
+            "SELECT prompt_type, model, COUNT(*) AS runs, SUM(error IS NOT NULL) AS errors, "
+            "AVG(latency_s) AS avg_latency_s, AVG(ttft_s) AS avg_ttft_s, "
+            "AVG(output_tokens) AS avg_output_tokens, AVG(total_cost) AS avg_cost "
+            f"FROM model_comparisons {where} GROUP BY prompt_type, model ORDER BY prompt_type, avg_cost",
+            params
+        )
+        return [dict(row) for row in rows]
+
+    # --- Reads ---
+
+    def _where(self, prompt_type: str, search_term: str | None,
+               param_filters: list[tuple[str, str | None]] | None = None) -> tuple[str, str, list]:
+        """Return (FROM clause, WHERE clause, params) for a type, optional search and parameter filters.
+
+        Each parameter filter is (name, value), or (name, None) for any value;
+        all must match. They are answered from the mj_params index.
+        """
+        source, where, params = self._search_where(prompt_type, search_term)
+        for name, value in param_filters or []:
+            where += " AND generations.id IN (SELECT generation_id FROM mj_params WHERE name = ?"
+            params.append(name)
+            if value is not None:
+                where += " AND value = ?"
+                params.append(value)
+            where += ")"
+        return source, where, params
+
+    def _search_where(self, prompt_type: str, search_term: str | None) -> tuple[str, str, list]:
+        if search_term and self.fts_enabled:
+            fts_query = build_fts_query(search_term)
+            if fts_query:
+                return ("generations_fts JOIN generations ON generations.id = generations_fts.rowid",
+                        "generations_fts MATCH ? AND generations.prompt_type = ?",
+                        [fts_query, prompt_type])
+        clauses = ["generations.prompt_type = ?"]
+        params: list = [prompt_type]
+        if search_term:
+            escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("(question LIKE ? ESCAPE '\\' OR output LIKE ? ESCAPE '\\')")
+            params += [f"%{escaped}%", f"%{escaped}%"]
+        return "generations", " AND ".join(clauses), params
+
+    def param_values(self, prompt_type: str | None = None, name: str | None = None, limit: int = 50) -> list[dict]:
+        """Most used parameter values (name, value, entries), optionally for one type or parameter."""
+        clauses, params = [], []
+        if prompt_type:
+            clauses.append("generations.prompt_type = ?")
+            params.append(prompt_type)
+        if name:
+            clauses.append("mj_params.name = ?")
+            params.append(name)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._read_conn().execute(
+            "SELECT mj_params.name AS name, mj_params.value AS value, COUNT(*) AS entries "
+            f"FROM mj_params JOIN generations ON generations.id = mj_params.generation_id {where} "
+            "GROUP BY mj_params.name, mj_params.value ORDER BY entries DESC, name, value LIMIT ?",
+            params + [limit])
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        for column in ("cost_info", "variations", "mj_params"):
+            if entry.get(column):
+                try:
+                    entry[column] = json.loads(entry[column])
+                except json.JSONDecodeError:
+                    entry[column] = None
+        try:
+            entry["timestamp"] = datetime.fromisoformat(entry["timestamp_iso"])
+        except (ValueError, TypeError):
+            entry["timestamp"] = None
+        return entry
+
+    def count(self, prompt_type: str, search_term: str | None = None,
+              param_filters: list[tuple[str, str | None]] | None = None) -> int:
+        source, where, params = self._where(prompt_type, search_term, param_filters)
+        return self._read_conn().execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params).fetchone()[0]
+
+    @staticmethod
+    def _row_to_listing(row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        entry["file"] = os.path.basename(entry["path"]) if entry["path"] else None
+        # Where the next page starts when this is the last entry on a page
+        entry["cursor"] = (entry["timestamp_iso"], entry["id"])
+        try:
+            entry["timestamp"] = datetime.fromisoformat(entry["timestamp_iso"])
+        except (ValueError, TypeError):
+            entry["timestamp"] = None
+        return entry
+
+    def get_page(self, prompt_type: str, search_term: str | None = None, limit: int = 10,
+                 after: tuple[str, int] | None = None, offset: int = 0,
+                 param_filters: list[tuple[str, str | None]] | None = None) -> list[dict]:
+        """Return one page of listing metadata (no output bodies), newest first.
+
+        Listings continue from `after`, the `cursor` of the previous page's
+        last entry, so every page costs the same however deep it is. Full-text
+        searches are ordered by relevance and page with `offset` instead.
+        Load the full entry with get_entry() when it is opened.
+        """
+        conn = self._read_conn()
+        source, where, params = self._where(prompt_type, search_term, param_filters)
+        if source != "generations":
+            # Rank the matches on ids alone, then look up just this page's metadata
+            ids = [row[0] for row in conn.execute(
+                f"SELECT generations.id FROM {source} WHERE {where} "
+                f"ORDER BY {FTS_RANK}, generations.timestamp_iso DESC, generations.id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset])]
+            if not ids:
+                return []
+            rows = {row["id"]: row for row in conn.execute(
+                f"SELECT {LISTING_COLUMNS} FROM generations WHERE id IN ({', '.join('?' * len(ids))})", ids)}
+            return [self._row_to_listing(rows[i]) for i in ids if i in rows]
+
+        if after is not None:
+            where += " AND (timestamp_iso, id) < (?, ?)"
+            params += list(after)
+            offset = 0
+        rows = conn.execute(
+            f"SELECT {LISTING_COLUMNS} FROM generations WHERE {where} "
+            "ORDER BY timestamp_iso DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset])
+        return [self._row_to_listing(row) for row in rows]
+
+    def get_entry(self, entry_id: int) -> dict | None:
+        """Return one full entry, including its output."""
+        row = self._read_conn().execute(f"SELECT {ENTRY_COLUMNS} FROM generations WHERE id = ?", (entry_id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def get_entries(self, prompt_type: str, search_term: str | None = None,
+                    limit: int | None = None, offset: int = 0,
+                    param_filters: list[tuple[str, str | None]] | None = None) -> list[dict]:
+        """Return entries paged with LIMIT/OFFSET.
+
+        Without a search term entries are newest first; full-text searches are
+        ordered by relevance, then recency.
+        """
+        source, where, params = self._where(prompt_type, search_term, param_filters)
+        columns = ", ".join(f"generations.{c.strip()}" for c in ENTRY_COLUMNS.split(","))
+        order = "generations.timestamp_iso DESC, generations.id DESC"
+        if source != "generations":
+            order = f"{FTS_RANK}, {order}"
+        sql = f"SELECT {columns} FROM {source} WHERE {where} ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        return [self._row_to_entry(row) for row in self.conn.execute(sql, params)]
@@ -0,0 +1,272 @@
+import os
+import re
+import atexit
+import threading
+
+# Seconds; model calls take from well under a second to minutes
+DEFAULT_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+DEFAULT_FLUSH_INTERVAL = 15.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), value)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> dict[tuple, float]:
+        """{(sample name, ((label, value), ...)): value}"""
+        with _lock:
+            return {(self.name, tuple(zip(self.labelnames, key))): value for key, value in self._values.items()}
+
+    def sample_labels(self, sample_name: str) -> tuple[str, ...] | None:
+        """Label order of one of this metric's sample names, or None if it is not ours."""
+        return self.labelnames if sample_name == self.name else None
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket (cumulative)..., sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> dict[tuple, float]:
+        samples = {}
+        with _lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            labels = tuple(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, state):
+                samples[(f"{self.name}_bucket", labels + (("le", repr(float(bound))),))] = count
+            samples[(f"{self.name}_bucket", labels + (("le", "+Inf"),))] = state[-1]
+            samples[(f"{self.name}_sum", labels)] = state[-2]
+            samples[(f"{self.name}_count", labels)] = state[-1]
+        return samples
+
+    def sample_labels(self, sample_name: str) -> tuple[str, ...] | None:
+        if sample_name == f"{self.name}_bucket":
+            return self.labelnames + ("le",)
+        if sample_name in (f"{self.name}_sum", f"{self.name}_count"):
+            return self.labelnames
+        return None
+
+
+class Registry:
+    """The metrics of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: list[Counter | Histogram] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def samples(self) -> dict[tuple, float]:
+        samples = {}
+        for metric in self.metrics:
+            samples.update(metric.samples())
+        return samples
+
+    def parse(self, text: str) -> dict[tuple, float]:
+        """Samples of our own metrics from exposition text; anything else is ignored."""
+        samples = {}
+        for line in text.splitlines():
+            match = SAMPLE_RE.match(line.strip())
+            if not match:
+                continue
+            name, labels, value = match.groups()
+            found = dict((k, _unescape(v)) for k, v in LABEL_RE.findall(labels or ""))
+            for metric in self.metrics:
+                order = metric.sample_labels(name)
+                if order is not None and set(order) == set(found):
+                    try:
+                        samples[(name, tuple((label, found[label]) for label in order))] = float(value)
+                    except ValueError:
+                        pass
+                    break
+        return samples
+
+    def render(self, samples: dict[tuple, float] | None = None) -> str:
+        samples = self.samples() if samples is None else samples
+        lines = []
+        for metric in self.metrics:
+            own = [(key, value) for key, value in samples.items() if metric.sample_labels(key[0]) is not None]
+            if not own:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            own.sort(key=lambda item: _sort_key(item[0]))
+            for (name, labels), value in own:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if labels
+                             else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _sort_key(key: tuple):
+    name, labels = key
+    plain = tuple(pair for pair in labels if pair[0] != "le")
+    le = next((float(v) for k, v in labels if k == "le"), 0.0)  # float("+Inf") sorts last
+    suffix_order = 0 if name.endswith("_bucket") else 1 if name.endswith("_sum") else 2
+    return plain, suffix_order, le
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "prompt_cli_requests_total", "Model calls, including failed ones.", ("model", "platform")))
+ERRORS = REGISTRY.register(Counter(
+    "prompt_cli_request_errors_total", "Model calls that raised, by exception type.", ("model", "platform", "error")))
+LATENCY = REGISTRY.register(Histogram(
+    "prompt_cli_request_latency_seconds", "Latency of successful model calls.", ("model", "platform")))
+TOKENS = REGISTRY.register(Counter(
+    "prompt_cli_tokens_total", "Tokens billed, by direction (input or output).", ("model", "platform", "direction")))
+COST = REGISTRY.register(Counter(
+    "prompt_cli_cost_dollars_total", "Spend in US dollars, as priced by calculate_prompt_price.", ("model", "platform")))
+RETRIES = REGISTRY.register(Counter(
+    "prompt_cli_retries_total", "Model calls retried, by reason (rate_limit, server or connection).",
+    ("model", "reason")))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "prompt_cli_cache_lookups_total", "Response cache lookups, by result (hit or miss).", ("result",)))
+
+
+def observe_call(model: str, platform: str, seconds: float, error: str | None = None):
+    """Record one model call (API or streamed)."""
+    REQUESTS.inc(model=model, platform=platform)
+    if error is None:
+        LATENCY.observe(seconds, model=model, platform=platform)
+    else:
+        ERRORS.inc(model=model, platform=platform, error=error)
+
+
+def observe_cost(model: str, platform: str, price_info: dict):
+    """Record the tokens and spend of one billed (not cached) generation."""
+    TOKENS.inc(price_info["input_tokens"], model=model, platform=platform, direction="input")
+    TOKENS.inc(price_info["output_tokens"], model=model, platform=platform, direction="output")
+    COST.inc(price_info["total_cost"], model=model, platform=platform)
+
+
+# --- Exporters ---
+
+_flushed: dict[tuple, float] = {}  # What this process has already added to the textfile
+
+
+def write_textfile(path: str):
+    """Add this process's new samples to a textfile for node_exporter's textfile collector.
+
+    The file accumulates across runs, so short scripted invocations are not
+    lost between scrapes. Concurrent writers take an exclusive lock, and the
+    file is replaced atomically, so the collector never reads half a file.
+    """
+    global _flushed
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a") as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except ImportError:
+            pass  # No advisory locks on this platform; writes are still atomic
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                merged = REGISTRY.parse(f.read())
+        except FileNotFoundError:
+            merged = {}
+        current = REGISTRY.samples()
+        for key, value in current.items():
+            merged[key] = merged.get(key, 0.0) + value - _flushed.get(key, 0.0)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(REGISTRY.render(merged))
+        os.replace(temp_path, path)
+        _flushed = current
+
+
+def start_textfile_exporter(path: str, interval: float = DEFAULT_FLUSH_INTERVAL):
+    """Flush to `path` every `interval` seconds in the background, and once more at exit."""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                write_textfile(path)
+            except OSError:
+                pass  # Try again next interval
+
+    def final_flush():
+        stop.set()
+        try:
+            write_textfile(path)
+        except OSError:
+            pass  # Best effort on exit
+
+    threading.Thread(target=loop, name="prompt-cli-metrics", daemon=True).start()
+    atexit.register(final_flush)
+
+
+def start_http_exporter(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics on a local port from a background thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would otherwise print over the TUI
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="prompt-cli-metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,168 @@
+import re
+from cli.src.profiling import timed
+
+# A numbered variation line, e.g. "3. A retro-futuristic scene ... --ar 3:2"
+VARIATION_LINE_RE = re.compile(r'^\s*(\d+)\.\s*(.*)$')
+
+# Runs of blank lines, collapsed to one for compact display
+EXTRA_NEWLINES_RE = re.compile(r'\n{3,}')
+
+# A Midjourney parameter with its values up to the next flag, e.g. "--ar 16:9", "--sref 123 456",
+# "--no cars, trees", "--iw -2" or just "--tile"
+MJ_PARAM_RE = re.compile(r'(?<![\w-])--([a-zA-Z][a-zA-Z0-9]*)((?:[ \t]+(?:-?\d|[^\s-])\S*)*)')
+# Punctuation that ends a sentence after a parameter value ("--v 7.") rather than belonging to it
+MJ_VALUE_TRAILING = '.,;:!?)"\'`'
+# A value ending a sentence ("--v 7. The light ...") is the flag's last one
+MJ_SENTENCE_END_RE = re.compile(r'[.!?][)"\'`]*$')
+# Where a filter line starts a new "--flag" (a negative number is a value)
+FLAG_START_RE = re.compile(r'^-+[a-zA-Z]')
+# A parameter filter typed by a user: "sref=3982906704", "--ar 16:9" or just "tile"
+PARAM_FILTER_RE = re.compile(r'^-*([a-zA-Z][a-zA-Z0-9]*)(?:\s*[=\s]\s*(\S+))?$')
+# Short and long spellings of the same parameter are stored under one name
+MJ_PARAM_ALIASES = {
+    'aspect': 'ar',
+    'version': 'v',
+    's': 'stylize',
+    'c': 'chaos',
+    'q': 'quality',
+}
+
+
+class StreamingVariationParser:
+    """Extract numbered variations ("1. ...") from output as it streams in.
+
+    Each complete line is parsed once when its newline arrives, so the
+    variations are ready as soon as the stream ends. A number on a line of its
+    own ("1.") takes the next non-blank line as its text.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pending_num: str | None = None
+        self.variations: list[tuple[str, str]] = []
+
+    def feed(self, delta: str):
+        self._buffer += delta
+        if "\n" not in delta:
+            return
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._parse_line(line)
+
+    def _parse_line(self, line: str):
+        if self._pending_num is not None:
+            if line.strip():
+                self.variations.append((self._pending_num, line.strip()))
+                self._pending_num = None
+            return
+        match = VARIATION_LINE_RE.match(line)
+        if match:
+            num, text = match.groups()
+            if text.strip():
+                self.variations.append((num, text.strip()))
+            else:
+                self._pending_num = num
+
+    def finish(self) -> list[tuple[str, str]]:
+        """Parse any trailing partial line and return all variations."""
+        if self._buffer:
+            self._parse_line(self._buffer)
+            self._buffer = ""
+        return self.variations
+
+
+def parse_variations(output: str) -> list[tuple[str, str]]:
+    """Extract numbered variations from a complete output in one linear pass."""
+    parser = StreamingVariationParser()
+    parser.feed(output)
+    return parser.finish()
+
+
+def clean_display_text(output: str) -> str:
+    """Markdown cleanup for display.
+
+    Equivalent to unwrapping **bold** and then dropping any remaining '*',
+    which together remove every asterisk.
+    """
+    return output.replace('*', '').strip()
+
+
+def normalize_param_name(name: str) -> str:
+    name = name.lower()
+    return MJ_PARAM_ALIASES.get(name, name)
+
+
+def parse_param_filter(text: str) -> tuple[str, str | None]:
+    """Turn a filter like "sref=3982906704", "--ar 16:9" or "tile" into (name, value).
+
+    The value is None when only the parameter name is given (match any value).
+    Raises ValueError for anything else.
+    """
+    match = PARAM_FILTER_RE.match(text.strip())
+    if not match:
+        raise ValueError(f"Invalid parameter filter '{text}', expected name=value (e.g. sref=3982906704)")
+    name, value = match.groups()
+    return normalize_param_name(name), value.rstrip(MJ_VALUE_TRAILING) if value else None
+
+
+def parse_param_filters(text: str) -> list[tuple[str, str | None]]:
+    """Parse a line of filters, e.g. "sref=3982906704 ar=16:9" or "--ar 16:9 --tile", into (name, value) pairs."""
+    filters, flag = [], None
+    for token in text.split():
+        if flag is not None and '=' not in token and not FLAG_START_RE.match(token):
+            filters.append(parse_param_filter(f"{flag} {token}"))
+            flag = None
+            continue
+        if flag is not None:
+            filters.append(parse_param_filter(flag))
+            flag = None
+        if FLAG_START_RE.match(token) and '=' not in token:
+            flag = token  # Its value, if any, is the next token
+        else:
+            filters.append(parse_param_filter(token))
+    if flag is not None:
+        filters.append(parse_param_filter(flag))
+    return filters
+
+
+def format_param_filters(param_filters: list[tuple[str, str | None]]) -> str:
+    return " ".join(f"--{name} {value}" if value is not None else f"--{name}" for name, value in param_filters)
+
+
+def parse_mj_params(text: str) -> dict[str, list[str]]:
+    """Midjourney parameters used in `text`, as {name: [distinct values, in order]}.
+
+    Every value up to the next flag counts ("--sref 123 456", "--no cars, trees");
+    flags without a value (e.g. --tile) map to an empty list.
+    """
+    params: dict[str, list[str]] = {}
+    for match in MJ_PARAM_RE.finditer(text):
+        name = normalize_param_name(match.group(1))
+        values = params.setdefault(name, [])
+        for token in match.group(2).split():
+            for value in token.split(','):
+                value = value.rstrip(MJ_VALUE_TRAILING)
+                if value and value not in values:
+                    values.append(value)
+            if MJ_SENTENCE_END_RE.search(token):
+                break
+    return params
+
+
+@timed("parse")
+def parse_output(output: str, question: str = "", variations: list[tuple[str, str]] | None = None) -> dict:
+    """Parse a generation once, for storing with its history record.
+
+    Returns the variations (as [number, text] pairs), the Midjourney
+    parameters and the cleaned display text. Parameters typed into the
+    question (e.g. "nosferatu --sref 3982906704") count as well. Pass
+    `variations` if they were already parsed, e.g. while streaming.
+    """
+    display_output = clean_display_text(output)
+    if variations is None:
+        variations = parse_variations(output)
+    return {
+        "variations": [list(v) for v in variations],
+        "mj_params": parse_mj_params(f"{question}\n{display_output}"),
+        "display_output": display_output,
+    }
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+import contextvars
+from inspect import iscoroutinefunction
+
+# Name of the innermost open span in the current thread or task
+_current: contextvars.ContextVar[str | None] = contextvars.ContextVar("prompt_cli_span", default=None)
+
+_lock = threading.Lock()
+# span name -> [calls, total ns, max ns]; always collected, it only costs two clock reads
+_stats: dict[str, list[int]] = {}
+_sink = None  # Open JSONL file while span records are being written
+_started_ns = time.perf_counter_ns()
+
+
+class span:
+    """Time a block of code as a named stage: `with span("history.save"): ...`
+
+    Every span updates in-process totals. While a JSONL sink is enabled (see
+    enable()) each span is also written as one record with its parent span
+    and any keyword attributes, e.g. span("api.agent", model="gpt-4o-mini").
+    """
+
+    __slots__ = ("name", "attrs", "_start", "_token")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self._token = _current.set(self.name)
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter_ns() - self._start
+        _current.reset(self._token)
+        with _lock:
+            stats = _stats.get(self.name)
+            if stats is None:
+                _stats[self.name] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+        if _sink is not None:
+            _write(self.name, elapsed, _current.get(), self.attrs, exc_type)
+        return False
+
+
+def timed(name: str):
+    """Decorator form of span() for plain and async functions."""
+    def decorate(fn):
+        if iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _write(name: str, elapsed_ns: int, parent: str | None, attrs: dict, exc_type):
+    record = {
+        "ts": round(time.time() - elapsed_ns / 1e9, 6),
+        "span": name,
+        "duration_ms": round(elapsed_ns / 1e6, 3),
+        "parent": parent,
+        "pid": os.getpid(),
+        "thread": threading.current_thread().name,
+    }
+    if attrs:
+        record["attrs"] = attrs
+    if exc_type is not None:
+        record["error"] = exc_type.__name__
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        if _sink is not None:
+            _sink.write(line)
+
+
+def enable(path: str):
+    """Also append every finished span to `path` as a JSON line (until disable() or exit)."""
+    global _sink
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with _lock:
+        if _sink is None:
+            _sink = open(path, 'a', encoding='utf-8')
+            atexit.register(disable)
+
+
+def disable():
+    global _sink
+    with _lock:
+        if _sink is not None:
+            _sink.close()
+        _sink = None
+
+
+def snapshot() -> dict[str, dict]:
+    """Totals per span name: calls, total/mean/max milliseconds."""
+    with _lock:
+        items = [(name, list(stats)) for name, stats in _stats.items()]
+    return {
+        name: {
+            "calls": calls,
+            "total_ms": round(total / 1e6, 3),
+            "mean_ms": round(total / calls / 1e6, 3),
+            "max_ms": round(longest / 1e6, 3),
+        }
+        for name, (calls, total, longest) in items
+    }
+
+
+def reset():
+    global _started_ns
+    with _lock:
+        _stats.clear()
+        _started_ns = time.perf_counter_ns()
+
+
+def render_report(console):
+    """Print a per-stage breakdown, slowest stage first."""
+    from rich.table import Table
+
+    stages = snapshot()
+    if not stages:
+        console.print("[info]Profile: no instrumented stages ran.[/info]")
+        return
+    wall_ms = (time.perf_counter_ns() - _started_ns) / 1e6
+    table = Table(title=f"Profile ({wall_ms:,.0f} ms since start)", show_header=True, header_style="bold magenta")
+    table.add_column("Stage", style="cyan")
+    table.add_column("Calls", justify="right")
+    table.add_column("Total", justify="right")
+    table.add_column("Mean", justify="right")
+    table.add_column("Max", justify="right")
+    table.add_column("% wall", justify="right", style="green")
+    for name, stats in sorted(stages.items(), key=lambda item: item[1]["total_ms"], reverse=True):
+        table.add_row(name, str(stats["calls"]), f"{stats['total_ms']:,.1f} ms", f"{stats['mean_ms']:,.2f} ms",
+                      f"{stats['max_ms']:,.1f} ms", f"{stats['total_ms'] / wall_ms * 100:.1f}%" if wall_ms else "-")
+    console.print(table)
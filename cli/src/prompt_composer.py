@@ -1,18 +1,26 @@
 import os
 import sys
-import re
-from dotenv import load_dotenv
+import atexit
+import shutil
 import asyncio
+import tempfile
+from dotenv import load_dotenv
 from rich.console import Console
 from rich.theme import Theme
-from openai import AsyncOpenAI
 from datetime import datetime
-import questionary
-from questionary import Style as QuestionaryStyle, Choice
-import json
-from cli.src.utils import count_tokens, calculate_prompt_price, get_agent_completion, copy_to_clipboard
-from cli.src.agents_config import create_midjourney_agent, create_udio_agent, create_suno_agent
+from functools import cached_property
+from cli.src.utils import count_tokens, count_prompt_tokens, calculate_prompt_price, completion_price_info, cached_price_info, get_agent_completion, stream_agent_completion, copy_to_clipboard
 from cli.src.history import PromptHistory
+from cli.src.history_store import HistoryStore
+from cli.src.segment_log import SegmentLog
+from cli.src.response_cache import ResponseCache
+from cli.src import runtime
+from cli.src import agents_config
+from cli.src import metrics
+from cli.src import cassette as cassettes
+from cli.src.costs import BudgetGuard, BudgetExceeded
+from cli.src.profiling import span, timed
+from cli.src.output_parser import StreamingVariationParser, clean_display_text, parse_output, parse_variations
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,8 +29,7 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 class PromptComposer:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    def __init__(self, use_cache: bool = True, stream: bool = False):
         self.models = {
             'gpt-4o-mini': {
                 'name': 'GPT-4o mini',
@@ -42,18 +49,21 @@ class PromptComposer:
             }
         }
         self.current_model = "gpt-4.1-2025-04-14"  # Default model
-        self.prompts = {
-            'midjourney': self.load_prompt('prompts/midjourney.txt'),
-            'udio': self.load_prompt('prompts/udio.txt'),
-            'suno': self.load_prompt('prompts/suno.txt')
-        }
-        # Initialize agents
-        self.update_agents()
         # Initialize history handler (not storing history within composer anymore)
         self.history_handler = PromptHistory()
+        # Daily and monthly spend caps, checked before every billed call
+        self.budget = BudgetGuard(self.history_handler.store, list(self.models))
+        # Agents run at temperature 0, so identical requests can be served from disk
+        self.cache = ResponseCache() if use_cache else None
+        # Render tokens as they arrive instead of waiting behind a spinner
+        self.stream = stream
         self.console = Console(theme=Theme({"info": "cyan", "warning": "yellow", "error": "bold red", "success": "bold green"}))
-        # Define custom style once
-        self.custom_style = QuestionaryStyle([
+
+    @cached_property
+    def custom_style(self):
+        """Questionary style, defined once (questionary is only imported for interactive use)."""
+        from questionary import Style as QuestionaryStyle
+        return QuestionaryStyle([
             ("question", "bold cyan"),
             ("answer", "bold green"),
             ("pointer", "bold cyan"),
@@ -62,20 +72,32 @@ class PromptComposer:
             ('separator', 'fg:#6C6C6C'),
         ])
 
-    def update_agents(self):
-        """Update agents with the current model."""
-        self.agents = {
-            'midjourney': create_midjourney_agent(model=self.current_model),
-            'udio': create_udio_agent(model=self.current_model),
-            'suno': create_suno_agent(model=self.current_model)
-        }
+    @cached_property
+    def replay_history(self) -> tuple[HistoryStore, SegmentLog]:
+        """Store and log in a temporary directory (removed on exit) for generations replayed from a cassette."""
+        scratch = tempfile.mkdtemp(prefix="prompt-cli-replay-")
+        atexit.register(shutil.rmtree, scratch, ignore_errors=True)
+        return (HistoryStore(os.path.join(scratch, 'history.db'), os.path.join(scratch, 'output')),
+                SegmentLog(os.path.join(scratch, 'log')))
+
+    def get_system_prompt(self, prompt_type: str) -> str:
+        """System prompt text for one platform, served from the agents_config prompt cache."""
+        return self.load_prompt(agents_config.PLATFORMS[prompt_type]['prompt_file'])
+
+    @property
+    def response_cache(self) -> ResponseCache | None:
+        """The response cache, or None while a cassette records or replays (it has to see every call)."""
+        return None if cassettes.active() else self.cache
+
+    def get_agent(self, prompt_type: str):
+        """Return the agent for a prompt type and the current model from the agent registry (built on first use)."""
+        return agents_config.get_agent(prompt_type, model=self.current_model)
 
     @staticmethod
     def load_prompt(file_path: str) -> str:
         full_path = os.path.join(os.path.dirname(__file__), '..', file_path)
         try:
-            with open(full_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            return agents_config.load_prompt(file_path)
         except FileNotFoundError:
             print(f"Error: Prompt file not found at {full_path}", file=sys.stderr)
             return ""
@@ -83,87 +105,382 @@ class PromptComposer:
             print(f"Error reading prompt file {full_path}: {e}", file=sys.stderr)
             return ""
 
-    async def generate_completion(self, prompt_type: str, question: str) -> str | None:
+    def format_cost_line(self, price_info: dict) -> str:
+        """Compact model, token and cost summary shown after each generation."""
+        if price_info.get("cached"):
+            cost_str = f"Cost: ${price_info['total_cost']:.4f} (cached, saved ${price_info['saved_cost']:.4f})"
+        else:
+            cost_str = f"Cost: ${price_info['total_cost']:.4f}"
+        if price_info.get("usage_source") == "estimate":
+            cost_str += " (estimated)"
+        model = price_info.get("model", self.current_model)
+        return f"[dim]Model: {self.models.get(model, {}).get('name', model)} | Tokens: {price_info['input_tokens']}in/{price_info['output_tokens']}out | {cost_str}[/dim]"
+
+    def record_cost(self, prompt_type: str, model: str, price_info: dict):
+        """Count a billed call in the metrics and the cost ledger."""
+        metrics.observe_cost(model, prompt_type, price_info)
         try:
-            # Calculate input tokens
-            system_prompt = self.prompts[prompt_type]
-            if not system_prompt:
-                self.console.print(f"[error]System prompt for '{prompt_type}' is missing or empty.[/error]")
-                return None
-            input_tokens = count_tokens(system_prompt + question)
-
-            # Use the Agents SDK instead of direct API calls
-            agent = self.agents[prompt_type]
-            content = await get_agent_completion(agent, question)
-
-            # Calculate output tokens and price
-            output_tokens = count_tokens(content)
-            price_info = calculate_prompt_price(input_tokens, output_tokens, self.current_model)
+            self.history_handler.store.record_cost(prompt_type, model, price_info)
+        except Exception as e:
+            self.console.print(f"[warning]Could not record cost: {str(e)}[/warning]")
 
-            # Display pricing information in a more compact format
-            self.console.print(f"\n[dim]Model: {self.models[self.current_model]['name']} | Tokens: {price_info['input_tokens']}in/{price_info['output_tokens']}out | Cost: ${price_info['total_cost']:.4f}[/dim]")
+    @timed("generate")
+    async def generate_completion(self, prompt_type: str, question: str, on_delta=None,
+                                  show_cost: bool = True) -> tuple[str | None, dict | None]:
+        """Generate output for a question; returns (content, price_info) or (None, None) on error.
 
-            return content
+        If on_delta is given the response is streamed and on_delta is called
+        with each text fragment (once with the whole text for a cache hit).
+        """
+        reserved = 0.0
+        try:
+            system_prompt = self.get_system_prompt(prompt_type)
+            if not system_prompt:
+                self.console.print(f"[error]System prompt for '{prompt_type}' is missing or empty.[/error]")
+                return None, None
+
+            # Serve repeated requests from the response cache, otherwise run the agent
+            agent = self.get_agent(prompt_type)
+            model = self.current_model
+            cache = self.response_cache
+            hit = cache.get(agent, question) if cache else None
+            cached = hit is not None
+            if cached:
+                content, usage = hit
+                if on_delta:
+                    on_delta(content)
+            else:
+                # Refuse, or switch to a cheaper model, if this call would break a budget
+                # (replayed calls cost nothing, so they skip the budget and the ledger)
+                billed = not cassettes.replaying()
+                if billed:
+                    model, reserved = self.budget.reserve(prompt_type, model, system_prompt, question)
+                if model != self.current_model:
+                    self.console.print(f"[warning]Over budget for {self.models[self.current_model]['name']}, "
+                                       f"using {self.models[model]['name']}.[/warning]")
+                    agent = agents_config.get_agent(prompt_type, model=model)
+                if on_delta:
+                    content, usage = await stream_agent_completion(agent, question, on_delta)
+                else:
+                    content, usage = await get_agent_completion(agent, question)
+                if cache:
+                    cache.put(agent, question, content, usage)
+
+            # Price from the API-reported usage; local token counts are only a fallback
+            price_info = completion_price_info(system_prompt, question, content, usage, model)
+            if cached:
+                price_info = cached_price_info(price_info)
+            elif billed:
+                self.record_cost(prompt_type, model, price_info)
+            price_info["model"] = model
+
+            if show_cost:
+                self.console.print("\n" + self.format_cost_line(price_info))
+
+            return content, price_info
+        except BudgetExceeded as e:
+            self.console.print(f"[error]Budget: {str(e)}[/error]")
+            return None, None
         except Exception as e:
             self.console.print(f"[error]API error: {type(e).__name__} - {str(e)}[/error]")
-            return None
+            return None, None
+        finally:
+            # Recorded (or failed) by now, so the estimate no longer holds budget back
+            self.budget.release(reserved)
+
+    def generate_streaming(self, prompt_type: str, question: str) -> tuple[str | None, dict | None, list[tuple[str, str]]]:
+        """Generate with tokens rendered as they arrive; returns (output, price_info, variations).
+
+        Variations are parsed while the stream is running, so the copy menu is
+        ready as soon as it ends.
+        """
+        parser = StreamingVariationParser()
+        status = self.console.status("[bold green]Generating...[/bold green]")
+        status.start()
+        started = False
+
+        def on_delta(delta: str):
+            nonlocal started
+            if not started:  # Swap the spinner for the output on the first token
+                status.stop()
+                self.console.print("\n[bold cyan]Generated Output:[/bold cyan]")
+                started = True
+            parser.feed(delta)
+            # Same cleanup as the non-streamed display: drop markdown emphasis
+            with span("render"):
+                self.console.out(delta.replace('*', ''), end="", highlight=False)
 
-    def save_output(self, prompt_type: str, question: str, output: str) -> str | None:
-        # Create output directory structure if it doesn't exist
-        home_dir = os.path.expanduser('~')
-        output_dir = os.path.join(home_dir, '.prompt-cli', 'output', prompt_type)
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Create a filename based on timestamp and prompt type
+        try:
+            output, price_info = runtime.run(self.generate_completion(prompt_type, question, on_delta=on_delta))
+        finally:
+            status.stop()
+        return output, price_info, parser.finish()
+
+    @timed("history.save")
+    def save_output(self, prompt_type: str, question: str, output: str, price_info: dict | None = None,
+                    model: str | None = None, parsed: dict | None = None) -> str | None:
+        """Save a generation to history and return its locator.
+
+        `parsed` is parse_output(output, question) if the caller already has it; the
+        output is parsed here otherwise, so history never has to re-parse it.
+        Replayed generations go to a throwaway store (see replay_history), so
+        saving still runs but the user's history only holds real ones.
+        """
+        model = model or (price_info or {}).get("model") or self.current_model
         timestamp = datetime.now()
-        timestamp_str = timestamp.strftime("%Y%m%d_%H%M%S")
-        # Keep a safe version of the question for context, but don't rely on it for uniqueness
-        safe_question_prefix = "".join([c if c.isalnum() else '_' for c in question[:30]]).rstrip('_')
-        filename = f"{prompt_type}_{timestamp_str}_{safe_question_prefix}.json"
 
-        file_path = os.path.join(output_dir, filename)
-
-        # Prepare data for JSON storage
-        # --- Calculate cost info again or retrieve if stored ---
-        # This assumes generate_completion returns cost info or we recalculate it here
-        # For simplicity, let's assume we recalculate based on the final output
-        try:
-            system_prompt = self.prompts[prompt_type]
-            input_tokens = count_tokens(system_prompt + question)
-            output_tokens = count_tokens(output)
-            price_info = calculate_prompt_price(input_tokens, output_tokens, self.current_model)
-        except Exception: # Basic fallback if token counting/pricing fails
-            price_info = {"error": "Could not calculate cost"}
+        # Prepare the history record
+        # --- Use the cost info from generate_completion, or recalculate it here ---
+        if price_info is None:
+            try:
+                system_prompt = self.get_system_prompt(prompt_type)
+                input_tokens = count_prompt_tokens(system_prompt, question, model)
+                output_tokens = count_tokens(output, model)
+                price_info = calculate_prompt_price(input_tokens, output_tokens, model)
+            except Exception: # Basic fallback if token counting/pricing fails
+                price_info = {"error": "Could not calculate cost"}
 
         data_to_save = {
             "prompt_type": prompt_type,
-            "model_used": self.current_model,
+            "model_used": model,
             "timestamp_iso": timestamp.isoformat(), # Store timestamp in ISO format
             "question": question,
             "output": output,
-            "cost_info": price_info
-            # Add other relevant metadata if needed
+            "cost_info": price_info,
+            # Variations, Midjourney parameters and display text, parsed once
+            **(parsed or parse_output(output, question)),
         }
 
-        # Save data as JSON
+        # Append to the history log (one line in a shared segment, not a file per generation)
         try:
-            with open(file_path, "w", encoding='utf-8') as f:
-                json.dump(data_to_save, f, indent=4) # Use indent for readability
-            return file_path
+            if cassettes.replaying():
+                store, log = self.replay_history
+                return store.append_entry(log, data_to_save)
+            return self.history_handler.save_entry(data_to_save)
         except Exception as e:
-            self.console.print(f"[error]Failed to save output to {file_path}: {str(e)}[/error]")
+            self.console.print(f"[error]Failed to save output to history: {str(e)}[/error]")
             return None # Return None on failure
 
+    def ask_description(self, prompt_noun: str) -> str | None:
+        """Prompt for a description; returns None if the user cancels or enters nothing."""
+        import questionary
+
+        # Display a clear prompt for user input
+        self.console.print(f"\n[bold cyan]Enter your description for {prompt_noun} generation:[/bold cyan]")
+        question = questionary.text(
+            f"Describe the {prompt_noun} (or type 'q' to cancel):", # Clarify 'q' action
+            style=self.custom_style
+        ).ask()
+
+        if question is None: # Handle Ctrl+C during text input
+            self.console.print('\n[warning]Input cancelled.[/warning]')
+            return None
+
+        # Handle empty input after clarifying 'q'
+        if not question:
+            self.console.print('[error]Please provide a description or type \'q\' to cancel.[/error]')
+            return None
+
+        # Check for 'q' specifically
+        if question.strip().lower() == 'q':
+            self.console.print('[warning]Generation cancelled.[/warning]')
+            return None
+        return question
+
+    @staticmethod
+    def clean_output(output: str) -> str:
+        """Basic markdown cleanup for display."""
+        return clean_display_text(output)
+
+    @staticmethod
+    def find_variations(output: str) -> list[tuple[str, str]]:
+        return parse_variations(output)
+
+    def generate_and_display(self, prompt_type: str, question: str):
+        """Generate for one platform from the menu, display and save the output, then offer copying."""
+        # --- Generation logic ---
+        if self.stream:
+            output, price_info, variations = self.generate_streaming(prompt_type, question)
+        else:
+            with self.console.status("[bold green]Generating...[/bold green]"):
+                # Run the async function on the shared event loop
+                output, price_info = runtime.run(self.generate_completion(prompt_type, question))
+            variations = None
+
+        if output:
+            # Parse once for display, copying and the saved record (streamed variations are reused)
+            parsed = parse_output(output, question, variations)
+            display_output = parsed['display_output']
+            # Display and save output (streamed output is already on screen)
+            if not self.stream:
+                with span("render"):
+                    self.console.print("\n[bold cyan]Generated Output:[/bold cyan]")
+                    self.console.print(display_output)
+
+            # Save output but don't display the path
+            self.save_output(prompt_type, question, output, price_info, parsed=parsed)
+
+            if variations is None:
+                variations = parsed['variations']
+            self.copy_menu(question, display_output, variations)
+
+        # Add a newline for spacing before looping back to main menu
+        self.console.print()
+
+    async def generate_many(self, prompt_types: list[str], question: str, on_result=None) -> dict[str, tuple[str | None, dict | None]]:
+        """Send one description to several platforms concurrently and save every result.
+
+        on_result(prompt_type, content, price_info) is called as each platform
+        finishes. Returns {prompt_type: (content, price_info)}.
+        """
+        async def generate_one(prompt_type: str):
+            return prompt_type, await self.generate_completion(prompt_type, question, show_cost=False)
+
+        results = {}
+        for next_done in asyncio.as_completed([generate_one(prompt_type) for prompt_type in prompt_types]):
+            prompt_type, (content, price_info) = await next_done
+            if content:
+                self.save_output(prompt_type, question, content, price_info)
+            results[prompt_type] = (content, price_info)
+            if on_result:
+                on_result(prompt_type, content, price_info)
+        return results
+
+    def fan_out_and_display(self, prompt_types: list[str], question: str):
+        """Generate for several platforms at once, showing each result as it arrives."""
+        sections = []
+        variations = []
+        status = self.console.status(f"[bold green]Generating for {len(prompt_types)} platforms...[/bold green]")
+
+        def show_result(prompt_type: str, content: str | None, price_info: dict | None):
+            name = agents_config.PLATFORMS[prompt_type]['name']
+            if not content:
+                self.console.print(f"\n[error]{name}: generation failed.[/error]")
+                return
+            display_output = self.clean_output(content)
+            section = f"[bold cyan]{name}:[/bold cyan]\n{display_output}"
+            sections.append(section)
+            variations.extend((f"{prompt_type} {num}", text) for num, text in self.find_variations(content))
+            self.console.print("\n" + section)
+            self.console.print(self.format_cost_line(price_info))
+
+        status.start()
+        try:
+            runtime.run(self.generate_many(prompt_types, question, on_result=show_result))
+        finally:
+            status.stop()
+
+        if sections:
+            self.copy_menu(question, "\n\n".join(sections), variations)
+        self.console.print()
+
+    def compare_and_display(self, prompt_type: str, question: str, models: list[str]):
+        """Run one description through several models and show latency and cost side by side."""
+        from cli.src.compare import compare_models, render_comparison
+
+        with self.console.status(f"[bold green]Comparing {len(models)} models...[/bold green]"):
+            results = runtime.run(compare_models(self, prompt_type, question, models))
+        render_comparison(self.console, self, results)
+        self.console.print()
+
+    def copy_menu(self, question: str, display_output: str, variations: list[tuple[str, str]]):
+        """Interactive copy loop for generated output (variations, or the prompt/full output)."""
+        import questionary
+        from questionary import Choice
+
+        copy_back_value = '__back__' # Define constant for back value
+
+        if variations:
+            # --- Loop for multiple copies ---
+            # Track the current selection index to maintain position
+            current_index = 0
+            while True:
+                self.console.print("\n[bold yellow]Copy a variation? (or go back)[/bold yellow]")
+                variation_choices = [
+                    Choice(f"{num}: {text.strip()[:60]}{'...' if len(text.strip()) > 60 else ''}", value=(i, text.strip()))
+                    for i, (num, text) in enumerate(variations)
+                ]
+                variation_choices.append(questionary.Separator())
+                variation_choices.append(Choice("Back to Main Menu", value=copy_back_value))
+
+                # Create a new questionary instance each time with the current index
+                selected_variation = questionary.select(
+                    "Select variation to copy:",
+                    choices=variation_choices,
+                    style=self.custom_style,
+                    default=variation_choices[current_index].value if current_index < len(variations) else None
+                ).ask()
+
+                if selected_variation is None or selected_variation == copy_back_value:
+                    break # Exit copy loop
+                else:
+                    # selected_variation is now a tuple of (index, text)
+                    index, text = selected_variation
+                    copy_to_clipboard(self.console, text, show_success=False)
+                    # Update the current index to maintain position
+                    current_index = index
+                    # Clear the console to reduce clutter
+                    self.console.clear()
+                    # Re-display the panel with the output
+                    self.console.print(display_output)
+            # --- End Loop ---
+        else:
+            # --- Loop for multiple copies (no variations) ---
+            # Define constants for copy actions
+            COPY_PROMPT = 'copy_prompt'
+            COPY_OUTPUT = 'copy_output'
+
+            while True:
+                self.console.print("\n[bold yellow]Copy output? (or go back)[/bold yellow]")
+                no_variation_choices = [
+                    Choice('Copy Original Prompt', value=COPY_PROMPT),
+                    Choice('Copy Full Output', value=COPY_OUTPUT),
+                    Choice("Back to Main Menu", value=copy_back_value)
+                ]
+                copy_choice = questionary.select(
+                    "Select an action:",
+                    choices=no_variation_choices,
+                    style=self.custom_style
+                ).ask()
+
+                if copy_choice is None or copy_choice == copy_back_value:
+                    break # Exit copy loop
+                elif copy_choice == COPY_PROMPT:
+                    copy_to_clipboard(self.console, question, show_success=False)
+                elif copy_choice == COPY_OUTPUT:
+                    # Use the cleaned display_output
+                    copy_to_clipboard(self.console, display_output, show_success=False)
+                # Clear the console to reduce clutter
+                self.console.clear()
+                # Re-display the panel with the output
+                self.console.print(display_output)
+            # --- End Loop ---
+
     def run(self):
+        import questionary
+        from questionary import Choice
+
+        # Load the model stack in the background while the menu is shown
+        runtime.prewarm()
+
         # Define constants for menu actions to avoid string comparisons
         ACTION_GEN_MIDJOURNEY = "gen_midjourney"
         ACTION_SELECT_MUSIC = "select_music"
         ACTION_GEN_UDIO = "gen_udio"
         ACTION_GEN_SUNO = "gen_suno"
+        ACTION_FAN_OUT = "fan_out"
+        ACTION_COMPARE_MODELS = "compare_models"
         ACTION_VIEW_HISTORY = "view_history"
         ACTION_SWITCH_MODEL = "switch_model"
         ACTION_QUIT = "quit_app"
 
+        # Platform and noun used in the description prompt for each single-platform action
+        generation_actions = {
+            ACTION_GEN_MIDJOURNEY: ('midjourney', 'image'),
+            ACTION_GEN_UDIO: ('udio', 'music'),
+            ACTION_GEN_SUNO: ('suno', 'instrumental music'),
+        }
+
         while True:
             self.console.print("\n=== Prompt Generator ===", style="bold blue")
 
@@ -171,6 +488,8 @@ class PromptComposer:
             choices = [
                 Choice("Generate Midjourney prompts for image creation", value=ACTION_GEN_MIDJOURNEY),
                 Choice("Generate music prompts", value=ACTION_SELECT_MUSIC),
+                Choice("Generate for multiple platforms at once", value=ACTION_FAN_OUT),
+                Choice("Compare models side by side", value=ACTION_COMPARE_MODELS),
                 Choice("View history of previously generated prompts", value=ACTION_VIEW_HISTORY),
                 Choice(f"Switch model (Current: {self.models[self.current_model]['name']})", value=ACTION_SWITCH_MODEL),
                 Choice("Quit the application", value=ACTION_QUIT)
@@ -226,13 +545,52 @@ class PromptComposer:
 
                 if new_model_key and new_model_key in self.models:
                     self.current_model = new_model_key
-                    self.update_agents()
                     self.console.print(f"[success]Switched to model: {self.models[self.current_model]['name']}[/success]")
                 elif new_model_key is not None: # User selected something, but it wasn't valid (shouldn't happen with Choice)
                     self.console.print("[error]Invalid model selection.[/error]")
                 # If new_model_key is None (Cancel or Ctrl+C), just continue
                 continue # Go back to main menu
 
+            elif selected_action == ACTION_FAN_OUT:
+                platform_choices = [
+                    Choice(config['name'], value=platform, checked=True)
+                    for platform, config in agents_config.PLATFORMS.items()
+                ]
+                selected_platforms = questionary.checkbox(
+                    "Select the platforms to generate for:",
+                    choices=platform_choices,
+                    style=self.custom_style
+                ).ask()
+                if not selected_platforms: # Ctrl+C or nothing selected
+                    continue # Go back to main menu
+
+                question = self.ask_description('multi-platform')
+                if question is None:
+                    continue # Go back to main menu
+                self.fan_out_and_display(selected_platforms, question)
+
+            elif selected_action == ACTION_COMPARE_MODELS:
+                prompt_type = questionary.select(
+                    "Which platform do you want to compare models on?",
+                    choices=[Choice(config['name'], value=platform) for platform, config in agents_config.PLATFORMS.items()],
+                    style=self.custom_style
+                ).ask()
+                if prompt_type is None:
+                    continue # Go back to main menu
+
+                selected_models = questionary.checkbox(
+                    "Select the models to compare:",
+                    choices=[Choice(value['name'], value=key, checked=True) for key, value in self.models.items()],
+                    style=self.custom_style
+                ).ask()
+                if not selected_models: # Ctrl+C or nothing selected
+                    continue # Go back to main menu
+
+                question = self.ask_description(dict(generation_actions.values())[prompt_type])
+                if question is None:
+                    continue # Go back to main menu
+                self.compare_and_display(prompt_type, question, selected_models)
+
             elif selected_action == ACTION_SELECT_MUSIC:
                 # Submenu for music generation options
                 music_choices = [
@@ -247,256 +605,22 @@ class PromptComposer:
                     style=self.custom_style
                 ).ask()
 
-                if music_action is None:
+                if music_action not in generation_actions:
                     continue  # Go back to main menu
-                
-                # Set selected_action to the chosen music option and continue directly to processing
-                selected_action = music_action
-                
-                # Immediately process the selected music action
-                if selected_action == ACTION_GEN_UDIO:
-                    prompt_type = 'udio'
-                    prompt_noun = 'music'
-                elif selected_action == ACTION_GEN_SUNO:
-                    prompt_type = 'suno'
-                    prompt_noun = 'instrumental music'
-                else:
-                    continue  # Invalid selection, go back to main menu
-                
-                # Display a clear prompt for user input
-                self.console.print(f"\n[bold cyan]Enter your description for {prompt_noun} generation:[/bold cyan]")
-                question = questionary.text(
-                    f"Describe the {prompt_noun} (or type 'q' to cancel):",
-                    style=self.custom_style
-                ).ask()
-                
-                if question is None:  # Handle Ctrl+C during text input
-                    self.console.print('\n[warning]Input cancelled.[/warning]')
-                    continue  # Go back to main menu
-                
-                # Handle empty input
-                if not question:
-                    self.console.print('[error]Please provide a description or type \'q\' to cancel.[/error]')
-                    continue
-                
-                # Check for 'q' specifically
-                if question.strip().lower() == 'q':
-                    self.console.print('[warning]Generation cancelled.[/warning]')
+
+                prompt_type, prompt_noun = generation_actions[music_action]
+                question = self.ask_description(prompt_noun)
+                if question is None:
                     continue  # Go back to main menu
-                
-                # --- Generation logic ---
-                with self.console.status("[bold green]Generating...[/bold green]"):
-                    # Run the async function
-                    output = asyncio.run(self.generate_completion(prompt_type, question))
-                
-                if output:
-                    # Display and save output
-                    self.console.print("\n[bold cyan]Generated Output:[/bold cyan]")
-                    display_output = re.sub(r'\*\*(.*?)\*\*', r'\1', output)  # Basic cleanup for display
-                    display_output = display_output.replace('*', '')
-                    self.console.print(display_output.strip())
-                    
-                    # Save output but don't display the path
-                    self.save_output(prompt_type, question, output)
-                    
-                    # --- Interactive Copy Logic ---
-                    variations = re.findall(r'^\s*(\d+)\.\s*(.*?)(?=\n\s*\d+\.|\n*$)', output, re.DOTALL | re.MULTILINE)
-                    
-                    copy_back_value = '__back__'  # Define constant for back value
-                    
-                    if variations:
-                        # --- Loop for multiple copies ---
-                        # Track the current selection index to maintain position
-                        current_index = 0
-                        while True:
-                            self.console.print("\n[bold yellow]Copy a variation? (or go back)[/bold yellow]")
-                            variation_choices = [
-                                Choice(f"{num}: {text.strip()[:60]}{'...' if len(text.strip()) > 60 else ''}", value=(i, text.strip()))
-                                for i, (num, text) in enumerate(variations)
-                            ]
-                            variation_choices.append(questionary.Separator())
-                            variation_choices.append(Choice("Back to Main Menu", value=copy_back_value))
-                            
-                            # Create a new questionary instance each time with the current index
-                            question = questionary.select(
-                                "Select variation to copy:",
-                                choices=variation_choices,
-                                style=self.custom_style,
-                                default=variation_choices[current_index].value if current_index < len(variations) else None
-                            )
-                            selected_variation = question.ask()
-                            
-                            if selected_variation is None or selected_variation == copy_back_value:
-                                break  # Exit copy loop
-                            else:
-                                # selected_variation is now a tuple of (index, text)
-                                index, text = selected_variation
-                                copy_to_clipboard(self.console, text, show_success=False)
-                                # Update the current index to maintain position
-                                current_index = index
-                                # Clear the console to reduce clutter
-                                self.console.clear()
-                                # Re-display the panel with the output
-                                self.console.print(display_output.strip())
-                    else:
-                        # --- Loop for multiple copies (no variations) ---
-                        # Define constants for copy actions
-                        COPY_PROMPT = 'copy_prompt'
-                        COPY_OUTPUT = 'copy_output'
-                        
-                        while True:
-                            self.console.print("\n[bold yellow]Copy output? (or go back)[/bold yellow]")
-                            no_variation_choices = [
-                                Choice('Copy Original Prompt', value=COPY_PROMPT),
-                                Choice('Copy Full Output', value=COPY_OUTPUT),
-                                Choice("Back to Main Menu", value=copy_back_value)
-                            ]
-                            copy_choice = questionary.select(
-                                "Select an action:",
-                                choices=no_variation_choices,
-                                style=self.custom_style
-                            ).ask()
-                            
-                            if copy_choice is None or copy_choice == copy_back_value:
-                                break  # Exit copy loop
-                            elif copy_choice == COPY_PROMPT:
-                                copy_to_clipboard(self.console, question, show_success=False)
-                                # Clear the console to reduce clutter
-                                self.console.clear()
-                                # Re-display the panel with the output
-                                self.console.print(display_output.strip())
-                            elif copy_choice == COPY_OUTPUT:
-                                # Use the cleaned display_output
-                                copy_to_clipboard(self.console, display_output.strip(), show_success=False)
-                                # Clear the console to reduce clutter
-                                self.console.clear()
-                                # Re-display the panel with the output
-                                self.console.print(display_output.strip())
-                
-                # Add a newline for spacing before looping back to main menu
-                self.console.print()
+                self.generate_and_display(prompt_type, question)
 
             elif selected_action == ACTION_GEN_MIDJOURNEY:
                 # Process Midjourney image generation
-                prompt_type = 'midjourney'
-                prompt_noun = 'image'
-                
-                # Display a clear prompt for user input
-                self.console.print(f"\n[bold cyan]Enter your description for {prompt_noun} generation:[/bold cyan]")
-                question = questionary.text(
-                    f"Describe the {prompt_noun} (or type 'q' to cancel):", # Clarify 'q' action
-                    style=self.custom_style
-                ).ask()
-
-                if question is None: # Handle Ctrl+C during text input
-                    self.console.print('\n[warning]Input cancelled.[/warning]')
-                    continue # Go back to main menu
-
-                # Handle empty input after clarifying 'q'
-                if not question:
-                    self.console.print('[error]Please provide a description or type \'q\' to cancel.[/error]')
-                    continue
-
-                # Check for 'q' specifically
-                if question.strip().lower() == 'q':
-                    self.console.print('[warning]Generation cancelled.[/warning]')
+                prompt_type, prompt_noun = generation_actions[ACTION_GEN_MIDJOURNEY]
+                question = self.ask_description(prompt_noun)
+                if question is None:
                     continue # Go back to main menu
-
-                # --- Generation logic ---
-                with self.console.status("[bold green]Generating...[/bold green]"):
-                    # Run the async function
-                    output = asyncio.run(self.generate_completion(prompt_type, question))
-
-                if output:
-                    # Display and save output
-                    self.console.print("\n[bold cyan]Generated Output:[/bold cyan]")
-                    display_output = re.sub(r'\*\*(.*?)\*\*', r'\1', output) # Basic cleanup for display
-                    display_output = display_output.replace('*', '')
-                    self.console.print(display_output.strip())
-
-                    # Save output but don't display the path
-                    self.save_output(prompt_type, question, output)
-
-                    # --- Interactive Copy Logic ---
-                    variations = re.findall(r'^\s*(\d+)\.\s*(.*?)(?=\n\s*\d+\.|\n*$)', output, re.DOTALL | re.MULTILINE)
-
-                    copy_back_value = '__back__' # Define constant for back value
-
-                    if variations:
-                        # --- Loop for multiple copies ---
-                        # Track the current selection index to maintain position
-                        current_index = 0
-                        while True:
-                            self.console.print("\n[bold yellow]Copy a variation? (or go back)[/bold yellow]")
-                            variation_choices = [
-                                Choice(f"{num}: {text.strip()[:60]}{'...' if len(text.strip()) > 60 else ''}", value=(i, text.strip()))
-                                for i, (num, text) in enumerate(variations)
-                            ]
-                            variation_choices.append(questionary.Separator())
-                            variation_choices.append(Choice("Back to Main Menu", value=copy_back_value))
-
-                            # Create a new questionary instance each time with the current index
-                            question = questionary.select(
-                                "Select variation to copy:",
-                                choices=variation_choices,
-                                style=self.custom_style,
-                                default=variation_choices[current_index].value if current_index < len(variations) else None
-                            )
-                            selected_variation = question.ask()
-
-                            if selected_variation is None or selected_variation == copy_back_value:
-                                break # Exit copy loop
-                            else:
-                                # selected_variation is now a tuple of (index, text)
-                                index, text = selected_variation
-                                copy_to_clipboard(self.console, text, show_success=False)
-                                # Update the current index to maintain position
-                                current_index = index
-                                # Clear the console to reduce clutter
-                                self.console.clear()
-                                # Re-display the panel with the output
-                                self.console.print(display_output.strip())
-                        # --- End Loop ---
-
-                    else:
-                        # --- Loop for multiple copies (no variations) ---
-                        # Define constants for copy actions
-                        COPY_PROMPT = 'copy_prompt'
-                        COPY_OUTPUT = 'copy_output'
-
-                        while True:
-                            self.console.print("\n[bold yellow]Copy output? (or go back)[/bold yellow]")
-                            no_variation_choices = [
-                                Choice('Copy Original Prompt', value=COPY_PROMPT),
-                                Choice('Copy Full Output', value=COPY_OUTPUT),
-                                Choice("Back to Main Menu", value=copy_back_value)
-                            ]
-                            copy_choice = questionary.select(
-                                "Select an action:",
-                                choices=no_variation_choices,
-                                style=self.custom_style
-                            ).ask()
-
-                            if copy_choice is None or copy_choice == copy_back_value:
-                                break # Exit copy loop
-                            elif copy_choice == COPY_PROMPT:
-                                copy_to_clipboard(self.console, question, show_success=False)
-                                # Clear the console to reduce clutter
-                                self.console.clear()
-                                # Re-display the panel with the output
-                                self.console.print(display_output.strip())
-                            elif copy_choice == COPY_OUTPUT:
-                                # Use the cleaned display_output
-                                copy_to_clipboard(self.console, display_output.strip(), show_success=False)
-                                # Clear the console to reduce clutter
-                                self.console.clear()
-                                # Re-display the panel with the output
-                                self.console.print(display_output.strip())
-                        # --- End Loop ---
-                    # --- END ADDED ---
-
-                # Add a newline for spacing before looping back to main menu
-                self.console.print()
+                self.generate_and_display(prompt_type, question)
             else:
                 # Handle cases where selected_action is not matched (should not happen with Choice)
                 self.console.print(f"[error]Unknown action: {selected_action}[/error]")
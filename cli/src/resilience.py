@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from cli.src import metrics
+from cli.src.profiling import span
+
+logger = logging.getLogger(__name__)
+
+# Attempts per call, the first one included (PROMPT_CLI_MAX_RETRIES sets the retries)
+DEFAULT_MAX_ATTEMPTS = 6
+# Exponential backoff: attempt n sleeps a random time up to min(CAP, BASE * 2**n) seconds
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+# Longest single wait honoured from a Retry-After header
+MAX_RETRY_AFTER = 60.0
+# Consecutive server or connection failures that open a model's circuit, and how long it stays open
+FAILURE_THRESHOLD = 5
+COOLDOWN = 30.0
+# Output tokens held against a tokens-per-minute budget until the real usage is known
+EXPECTED_OUTPUT_TOKENS = 600
+
+RATE_LIMIT = "rate_limit"
+SERVER = "server"
+CONNECTION = "connection"
+
+
+class CircuitOpen(Exception):
+    """Raised without calling the API while a model's circuit is open."""
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously; the bucket starts full."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the bucket wait for a full one)."""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) * 60.0 / self.capacity
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def resize(self, per_minute: float):
+        self.level = min(self.level, per_minute)
+        self.capacity = per_minute
+
+    def sync(self, remaining: float, now: float):
+        """Never assume more is left than the API reports (other processes share the limit)."""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+class ModelLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one model.
+
+    Limits come from PROMPT_CLI_RATE_LIMITS, or are learned from the API's
+    x-ratelimit-* response headers; until then calls are not held back. A 429
+    pauses every caller of the model for its Retry-After, instead of letting
+    each one find out on its own.
+    """
+
+    def __init__(self, rpm: float | None = None, tpm: float | None = None):
+        self.configured = rpm is not None or tpm is not None
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+
+    def _wait_time(self, tokens: int) -> float:
+        now = time.monotonic()
+        return max(self.paused_until - now,
+                   self.requests.wait_time(1, now) if self.requests else 0.0,
+                   self.tokens.wait_time(tokens, now) if self.tokens else 0.0)
+
+    async def acquire(self, tokens: int):
+        """Wait until one request of about `tokens` tokens fits in both buckets, then take it."""
+        wait = self._wait_time(tokens)
+        if wait > 0:
+            with span("api.rate_limit_wait"):
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = self._wait_time(tokens)
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+
+    def settle(self, reserved: int, used: int | None):
+        """Correct the token bucket once a call's real usage is known."""
+        if self.tokens and used is not None:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved - used)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe_headers(self, headers):
+        now = time.monotonic()
+        for kind in ("requests", "tokens"):
+            limit = _number(headers.get(f"x-ratelimit-limit-{kind}"))
+            remaining = _number(headers.get(f"x-ratelimit-remaining-{kind}"))
+            bucket = getattr(self, kind)
+            if limit and not self.configured:
+                if bucket is None:
+                    bucket = TokenBucket(limit)
+                    setattr(self, kind, bucket)
+                elif bucket.capacity != limit:
+                    bucket.resize(limit)
+            if bucket is not None and remaining is not None:
+                bucket.sync(remaining, now)
+
+
+class CircuitBreaker:
+    """Stop calling a model that keeps failing, then let one trial call through after a cooldown.
+
+    Only server errors, timeouts and connection failures count; rate limits
+    are the limiter's job, and other errors show the API is reachable.
+    """
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_running = False
+
+    def before_call(self, model: str) -> bool:
+        """Raise CircuitOpen if the model may not be called; True if this call is the trial one."""
+        if self.opened_at is None:
+            return False
+        remaining = self.cooldown - (time.monotonic() - self.opened_at)
+        if remaining > 0 or self.trial_running:
+            raise CircuitOpen(f"{model} failed {self.failures} times in a row; not calling it for "
+                              f"{max(remaining, 0.0):.0f}s")
+        self.trial_running = True  # Half open: this call decides
+        return True
+
+    def abandon_trial(self):
+        """Let another call be the trial when this one ended without a result (e.g. it was cancelled)."""
+        self.trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_running or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+def _number(value) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_rate_limits(spec: str | None) -> dict[str, tuple[float | None, float | None]]:
+    """Parse "model=RPM:TPM,..." (either side may be empty) into {model: (rpm, tpm)}."""
+    limits = {}
+    for item in (spec or "").split(","):
+        model, sep, values = item.strip().partition("=")
+        if not sep:
+            continue
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (_number(rpm or None), _number(tpm or None))
+    return limits
+
+
+_limiters: dict[str, ModelLimiter] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+_configured: dict[str, tuple[float | None, float | None]] | None = None
+
+
+def limiter_for(model: str) -> ModelLimiter:
+    global _configured
+    limiter = _limiters.get(model)
+    if limiter is None:
+        if _configured is None:
+            _configured = parse_rate_limits(os.getenv("PROMPT_CLI_RATE_LIMITS"))
+        limiter = _limiters[model] = ModelLimiter(*_configured.get(model, (None, None)))
+    return limiter
+
+
+def breaker_for(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker()
+    return breaker
+
+
+def reset():
+    """Forget learned limits, pauses and circuit state (and re-read PROMPT_CLI_RATE_LIMITS)."""
+    global _configured
+    _limiters.clear()
+    _breakers.clear()
+    _configured = None
+
+
+def classify(error: Exception) -> str | None:
+    """RATE_LIMIT, SERVER or CONNECTION for errors worth retrying, None for the rest."""
+    import openai
+
+    if isinstance(error, openai.RateLimitError):
+        # An exhausted quota will not recover by waiting
+        return None if getattr(error, "code", None) == "insufficient_quota" else RATE_LIMIT
+    if isinstance(error, openai.APIStatusError):
+        return SERVER if error.status_code >= 500 or error.status_code in (408, 409) else None
+    if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError, ConnectionError)):
+        return CONNECTION
+    return None
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds the API asked us to wait (Retry-After or retry-after-ms), if it did."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    milliseconds = _number(headers.get("retry-after-ms"))
+    if milliseconds is not None:
+        return min(milliseconds / 1000.0, MAX_RETRY_AFTER)
+    value = headers.get("retry-after")
+    seconds = _number(value)
+    if seconds is None and value:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER) if seconds is not None else None
+
+
+def backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter, so retrying callers spread out instead of colliding."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def max_attempts() -> int:
+    retries = _number(os.getenv("PROMPT_CLI_MAX_RETRIES"))
+    return int(retries) + 1 if retries is not None and retries >= 0 else DEFAULT_MAX_ATTEMPTS
+
+
+async def call(model: str, run, estimate_tokens=None, used_tokens=None, can_retry=None):
+    """Await run() for `model` under its rate limits, retrying transient failures.
+
+    estimate_tokens() sizes the request for a tokens-per-minute limit (only
+    called when the model has one); used_tokens(result) returns the real
+    total once known. Pass can_retry() to veto retries, e.g. once a stream
+    has shown output.
+    """
+    limiter = limiter_for(model)
+    breaker = breaker_for(model)
+    attempts = max_attempts()
+    for attempt in range(attempts):
+        trial = breaker.before_call(model)
+        try:
+            tokens = estimate_tokens() if estimate_tokens and limiter.tokens else 0
+            await limiter.acquire(tokens)
+            try:
+                result = await run()
+            except Exception as e:
+                limiter.settle(tokens, 0)  # A failed attempt uses none of the tokens it held
+                kind = classify(e)
+                if kind in (SERVER, CONNECTION):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()  # The API answered (a 429 only means it is busy)
+                if kind is None or attempt + 1 >= attempts or (can_retry and not can_retry()):
+                    raise
+                error = e
+            else:
+                breaker.record_success()
+                if tokens:
+                    limiter.settle(tokens, used_tokens(result) if used_tokens else None)
+                return result
+        finally:
+            # Cancelled (or interrupted) before the trial call settled the circuit
+            if trial and breaker.trial_running:
+                breaker.abandon_trial()
+        requested = retry_after(error)
+        delay = requested if requested is not None else backoff(attempt)
+        if kind == RATE_LIMIT:
+            limiter.pause(delay)
+        metrics.RETRIES.inc(model=model, reason=kind)
+        logger.warning(f"{type(error).__name__} from {model}, retrying in {delay:.1f}s "
+                       f"(attempt {attempt + 2} of {attempts})")
+        await asyncio.sleep(delay)
+
+
+async def observe_response(response):
+    """httpx response hook: learn each model's rate limits from the API's headers."""
+    if "x-ratelimit-limit-requests" not in response.headers and "x-ratelimit-remaining-tokens" not in response.headers:
+        return
+    try:
+        model = json.loads(response.request.content).get("model")
+    except (ValueError, AttributeError, UnicodeDecodeError):
+        return
+    if model:
+        limiter_for(model).observe_headers(response.headers)
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from cli.src.history_store import PROMPT_CLI_DIR
+from cli.src.profiling import timed
+from cli.src import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    usage TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+"""
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60  # 30 days
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # 50 MB of cached output text
+
+
+def cache_key(agent, user_input: str) -> str:
+    """Hash everything that determines an agent's output into a cache key.
+
+    Covers the system prompt text, the model, the non-default model settings
+    and the user input, so editing a prompt file or switching model misses.
+    """
+    settings = agent.model_settings.to_json_dict() if agent.model_settings else {}
+    payload = {
+        "instructions": agent.instructions,
+        "model": str(agent.model),
+        # Drop unset settings so new SDK fields don't invalidate existing entries
+        "model_settings": {k: v for k, v in settings.items() if v is not None},
+        "input": user_input,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """On-disk, content-addressed cache of agent completions (~/.prompt-cli/cache.db).
+
+    Entries expire after `ttl_seconds`; when the cached text exceeds
+    `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path: str | None = None, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.db_path = db_path or os.path.join(PROMPT_CLI_DIR, 'cache.db')
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(responses)")]
+        if "usage" not in columns:  # Caches created before usage was recorded
+            self.conn.execute("ALTER TABLE responses ADD COLUMN usage TEXT")
+        self.conn.commit()
+
+    @timed("cache.get")
+    def get(self, agent, user_input: str) -> tuple[str, dict | None] | None:
+        """Return the cached (content, usage) for this agent and input, or None."""
+        hit = self._lookup(agent, user_input)
+        metrics.CACHE_LOOKUPS.inc(result="hit" if hit is not None else "miss")
+        return hit
+
+    def _lookup(self, agent, user_input: str) -> tuple[str, dict | None] | None:
+        key = cache_key(agent, user_input)
+        row = self.conn.execute("SELECT content, created_at, usage FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with self.conn:
+            if now - row[1] > self.ttl_seconds:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return row[0], json.loads(row[2]) if row[2] else None
+
+    @timed("cache.put")
+    def put(self, agent, user_input: str, content: str, usage: dict | None = None):
+        """Store a completion (and its reported usage) and enforce the TTL and size limits."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, created_at, last_used, size, content, usage) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(agent, user_input), str(agent.model), now, now, len(content.encode('utf-8')), content,
+                 json.dumps(usage) if usage else None)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self.conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used, dropping entries until back under the limit
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used ASC"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM responses")
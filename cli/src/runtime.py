@@ -0,0 +1,99 @@
+import os
+import atexit
+import asyncio
+import threading
+from typing import TYPE_CHECKING
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+_lock = threading.Lock()
+_loop: asyncio.AbstractEventLoop | None = None
+_thread: threading.Thread | None = None
+_client: "AsyncOpenAI | None" = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the long-lived event loop, starting its background thread on first use."""
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="prompt-cli-loop", daemon=True)
+            _thread.start()
+            atexit.register(shutdown)
+        return _loop
+
+
+def run(coro):
+    """Run a coroutine on the shared loop and block until it finishes.
+
+    This replaces per-call asyncio.run(), which creates and tears down a loop
+    (and with it every pooled HTTP connection) on each generation.
+    """
+    loop = get_loop()
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result()
+    except KeyboardInterrupt:
+        future.cancel()
+        raise
+
+
+def get_client() -> "AsyncOpenAI":
+    """Return the process-wide AsyncOpenAI client.
+
+    The client keeps a pooled, keep-alive HTTP connection and is also installed
+    as the Agents SDK default, so agent runs and direct API calls share it.
+    It must only be used from the shared loop (see run()).
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            # Heavy imports are deferred until the first model call (or prewarm())
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            from agents import set_default_openai_client
+            from cli.src.resilience import observe_response
+            # Retries are left to cli.src.resilience, which paces them across concurrent callers
+            _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0,
+                                  http_client=DefaultAsyncHttpxClient(event_hooks={"response": [observe_response]}))
+            set_default_openai_client(_client)
+        return _client
+
+
+def prewarm():
+    """Import the model stack and create the client on the loop thread, in the background.
+
+    Lets the interactive menu appear immediately while the first generation
+    still finds everything loaded.
+    """
+    get_loop().call_soon_threadsafe(_prewarm)
+
+
+def _prewarm():
+    try:
+        get_client()
+        import cli.src.agents_config  # noqa: F401
+    except Exception:
+        pass  # Errors resurface, with context, on the first real call
+
+
+def shutdown():
+    """Close the shared client and stop the loop (registered with atexit)."""
+    global _loop, _thread, _client
+    loop, client = _loop, _client
+    if loop is None or not loop.is_running():
+        return
+    if client is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=5)
+        except Exception:
+            pass  # Best effort on exit
+    loop.call_soon_threadsafe(loop.stop)
+    if _thread is not None:
+        _thread.join(timeout=5)
+    _loop, _thread, _client = None, None, None
@@ -0,0 +1,274 @@
+import os
+import re
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No advisory locks on this platform; only this process's writers are serialized
+
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024  # Rotate to a new segment after 16 MB
+DEFAULT_SYNC_RECORDS = 32  # fsync after this many unsynced appends...
+DEFAULT_SYNC_INTERVAL = 1.0  # ...or when the last fsync is this many seconds old
+
+SEGMENT_RE = re.compile(r'^(\d{6})\.jsonl$')
+COMPACTING_SUFFIX = '.compacting'
+# Per-type lock file that serializes appends, rotation and compaction across processes
+LOCK_FILE = '.lock'
+
+
+class CompactionIncomplete(Exception):
+    """Raised instead of dropping old segments when a compacted segment has gone missing."""
+
+
+def format_locator(segment_path: str, offset: int) -> str:
+    """Address of one record in the log, stored as the record's history path."""
+    return f"{segment_path}#{offset}"
+
+
+def parse_locator(locator: str) -> tuple[str, int] | None:
+    """Split a locator into (segment path, byte offset); None for legacy file paths."""
+    segment_path, sep, offset = locator.rpartition('#')
+    if not sep or not offset.isdigit() or not SEGMENT_RE.match(os.path.basename(segment_path)):
+        return None
+    return segment_path, int(offset)
+
+
+class SegmentLog:
+    """Append-only JSONL log of saved generations (~/.prompt-cli/log/<prompt_type>/000001.jsonl, ...).
+
+    Each record is one line, located by (segment, offset, length); the history
+    store keeps that offset index. Appends are flushed straight away, so other
+    readers see them, but fsynced in groups: a power loss can drop at most the
+    last `sync_every` records or `sync_interval` seconds of writes. Pending
+    records are synced on close(), which also runs at exit. Processes that
+    share a log (say a batch run and an interactive session) take an
+    exclusive lock on the type's directory for every append and rotation.
+    """
+
+    def __init__(self, root_dir: str | None = None, max_segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                 sync_every: int = DEFAULT_SYNC_RECORDS, sync_interval: float = DEFAULT_SYNC_INTERVAL):
+        self.root_dir = root_dir or os.path.join(os.path.expanduser('~'), '.prompt-cli', 'log')
+        self.max_segment_bytes = max_segment_bytes
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        # Serializes this process's writers; locked() adds the lock shared with other processes
+        self.lock = threading.RLock()
+        self._writers: dict[str, tuple[str, object]] = {}  # prompt_type -> (segment path, open file)
+        self._lock_files: dict[str, tuple[object, int]] = {}  # prompt_type -> (open lock file, nesting depth)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        atexit.register(self.close)
+
+    # --- Layout ---
+
+    def type_dir(self, prompt_type: str) -> str:
+        return os.path.join(self.root_dir, prompt_type)
+
+    def prompt_types(self) -> list[str]:
+        if not os.path.isdir(self.root_dir):
+            return []
+        return sorted(d for d in os.listdir(self.root_dir) if os.path.isdir(os.path.join(self.root_dir, d)))
+
+    def segments(self, prompt_type: str) -> list[str]:
+        """Segment paths for a prompt type, oldest first."""
+        type_dir = self.type_dir(prompt_type)
+        if not os.path.isdir(type_dir):
+            return []
+        return [os.path.join(type_dir, f) for f in sorted(os.listdir(type_dir)) if SEGMENT_RE.match(f)]
+
+    def _segment_path(self, prompt_type: str, number: int) -> str:
+        return os.path.join(self.type_dir(prompt_type), f"{number:06d}.jsonl")
+
+    @staticmethod
+    def _segment_number(segment_path: str) -> int:
+        return int(SEGMENT_RE.match(os.path.basename(segment_path)).group(1))
+
+    # --- Writes ---
+
+    @contextmanager
+    def locked(self, prompt_type: str):
+        """Hold the log of one prompt type against this and every other process (reentrant)."""
+        with self.lock:
+            lock_file, depth = self._lock_files.get(prompt_type, (None, 0))
+            if lock_file is None:
+                os.makedirs(self.type_dir(prompt_type), exist_ok=True)
+                lock_file = open(os.path.join(self.type_dir(prompt_type), LOCK_FILE), 'a')
+            if depth == 0 and fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._lock_files[prompt_type] = (lock_file, depth + 1)
+            try:
+                yield
+            finally:
+                self._lock_files[prompt_type] = (lock_file, depth)
+                if depth == 0 and fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _writer(self, prompt_type: str, incoming: int):
+        """Return (path, file, offset) for the next record, rotating when the segment would grow past the limit.
+
+        Must be called under locked(): other processes may have appended to or
+        rotated the segment since this one last wrote, so the position is read
+        from the file itself rather than from our own bookkeeping.
+        """
+        segment_path, f = self._writers.get(prompt_type, (None, None))
+        if f is not None and os.path.exists(self._segment_path(prompt_type, self._segment_number(segment_path) + 1)):
+            f.close()  # Another process rotated to a newer segment
+            f = None
+        if f is None:
+            existing = self.segments(prompt_type)
+            segment_path = existing[-1] if existing else self._segment_path(prompt_type, 1)
+            f = open(segment_path, 'a+b')
+        size = os.fstat(f.fileno()).st_size
+        if size and os.pread(f.fileno(), 1, size - 1) != b"\n":
+            f.write(b"\n")  # Seal a line torn by a crash; readers skip it
+            size += 1
+        if size and size + incoming > self.max_segment_bytes:
+            self._sync_file(f)
+            f.close()
+            segment_path = self._segment_path(prompt_type, self._segment_number(segment_path) + 1)
+            f = open(segment_path, 'a+b')
+            size = os.fstat(f.fileno()).st_size
+        self._writers[prompt_type] = (segment_path, f)
+        return segment_path, f, size
+
+    @staticmethod
+    def _sync_file(f):
+        f.flush()
+        os.fsync(f.fileno())
+
+    def append(self, prompt_type: str, record: dict) -> tuple[str, int, int]:
+        """Append one record and return its (segment path, offset, length)."""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        with self.locked(prompt_type):
+            segment_path, f, offset = self._writer(prompt_type, len(line))
+            f.write(line)
+            f.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self.sync()
+        return segment_path, offset, len(line)
+
+    def sync(self):
+        """fsync every open segment (one group commit for all pending appends)."""
+        with self.lock:
+            for _, f in self._writers.values():
+                self._sync_file(f)
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def _close_writer(self, prompt_type: str):
+        _, f = self._writers.pop(prompt_type, (None, None))
+        if f is not None:
+            self._sync_file(f)
+            f.close()
+
+    def close(self):
+        with self.lock:
+            for prompt_type in list(self._writers):
+                self._close_writer(prompt_type)
+            self._unsynced = 0
+            for prompt_type, (lock_file, depth) in list(self._lock_files.items()):
+                if depth == 0:
+                    lock_file.close()
+                    del self._lock_files[prompt_type]
+
+    # --- Reads ---
+
+    @staticmethod
+    def read_at(segment_path: str, offset: int) -> dict | None:
+        """Read the single record at a byte offset, or None if it is missing or damaged."""
+        try:
+            with open(segment_path, 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def iter_records(self, prompt_type: str, start_offsets: dict[str, int] | None = None):
+        """Stream (segment path, offset, length, record) for a prompt type, oldest first.
+
+        `start_offsets` maps segment paths to the byte offset to resume from, so
+        callers can read only what they have not seen yet. Torn or damaged
+        lines are skipped.
+        """
+        start_offsets = start_offsets or {}
+        for segment_path in self.segments(prompt_type):
+            offset = start_offsets.get(segment_path, 0)
+            with open(segment_path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    length = len(line)
+                    if line.endswith(b"\n") and line.strip():
+                        try:
+                            yield segment_path, offset, length, json.loads(line)
+                        except ValueError:
+                            pass
+                    offset += length
+
+    # --- Compaction ---
+
+    def write_compacted(self, prompt_type: str, records) -> tuple[list[str], list[str], list[tuple[str, int, int]]]:
+        """Write `records` into fresh segments after the current ones, as .compacting files.
+
+        Returns (old segments, temporary files, final locations). Nothing becomes
+        visible until finish_compaction() renames the temporary files; callers
+        must hold locked(prompt_type) from here until then. Locations use the final names.
+        """
+        with self.locked(prompt_type):
+            self._close_writer(prompt_type)
+            old_segments = self.segments(prompt_type)
+            number = self._segment_number(old_segments[-1]) + 1 if old_segments else 1
+            os.makedirs(self.type_dir(prompt_type), exist_ok=True)
+            temp_files, locations = [], []
+            f = None
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+                if f is None or (f.tell() and f.tell() + len(line) > self.max_segment_bytes):
+                    if f is not None:
+                        self._sync_file(f)
+                        f.close()
+                        number += 1
+                    temp_files.append(self._segment_path(prompt_type, number) + COMPACTING_SUFFIX)
+                    f = open(temp_files[-1], 'wb')
+                locations.append((temp_files[-1][:-len(COMPACTING_SUFFIX)], f.tell(), len(line)))
+                f.write(line)
+            if f is not None:
+                self._sync_file(f)
+                f.close()
+            return old_segments, temp_files, locations
+
+    def finish_compaction(self, old_segments: list[str], temp_files: list[str]):
+        """Publish compacted segments and drop the ones they replace (safe to repeat).
+
+        Callers must hold locked(prompt_type). Raises CompactionIncomplete, and
+        keeps the old segments, if a compacted segment is neither pending nor published.
+        """
+        with self.lock:
+            missing = [temp_path for temp_path in temp_files
+                       if not os.path.exists(temp_path) and not os.path.exists(temp_path[:-len(COMPACTING_SUFFIX)])]
+            if missing:
+                raise CompactionIncomplete(f"Compacted segment {missing[0]} is missing; "
+                                           f"keeping the {len(old_segments)} segments it was to replace")
+            for temp_path in temp_files:
+                if os.path.exists(temp_path):
+                    os.replace(temp_path, temp_path[:-len(COMPACTING_SUFFIX)])
+            for segment_path in old_segments:
+                if os.path.exists(segment_path):
+                    os.remove(segment_path)
+
+    def discard_incomplete(self, prompt_type: str):
+        """Remove .compacting files of a type left by a compaction that never committed.
+
+        Callers must hold locked(prompt_type); other types may be compacting.
+        """
+        type_dir = self.type_dir(prompt_type)
+        if not os.path.isdir(type_dir):
+            return
+        for f in os.listdir(type_dir):
+            if f.endswith(COMPACTING_SUFFIX):
+                os.remove(os.path.join(type_dir, f))
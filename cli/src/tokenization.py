@@ -1,20 +1,53 @@
-import tiktoken
 from functools import lru_cache
 from typing import List, Dict, Any
+from cli.src.profiling import timed
 
 MODEL = "gpt-4o-mini"
+# Used for models tiktoken doesn't know yet; all current OpenAI chat models use it
+FALLBACK_ENCODING = "o200k_base"
 
-@lru_cache(maxsize=1)
-def get_encoding():
-    return tiktoken.encoding_for_model(MODEL)
+@lru_cache(maxsize=None)
+def get_encoding(model: str = MODEL):
+    """Return the (cached) tiktoken encoding for a model."""
+    import tiktoken  # Imported on first use to keep it off the startup path
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+def tokenize(text: str, model: str = MODEL) -> List[int]:
+    return get_encoding(model).encode(text)
+
+@timed("tokens.count")
+def count_tokens(text: str, model: str = MODEL) -> int:
+    """Count the tokens in a text string for the given model."""
+    return len(get_encoding(model).encode_ordinary(text))
+
+@lru_cache(maxsize=64)
+def count_tokens_cached(text: str, model: str = MODEL) -> int:
+    """Memoized count_tokens for long, repeated texts such as system prompts.
+
+    Python caches a str's hash, so lookups for the same prompt object are O(1).
+    """
+    return count_tokens(text, model)
+
+def count_prompt_tokens(system_prompt: str, user_input: str, model: str = MODEL) -> int:
+    """Input tokens for a system prompt plus user input, reusing the memoized system prompt count."""
+    return count_tokens_cached(system_prompt, model) + count_tokens(user_input, model)
+
+def encode_batch(texts: List[str], model: str = MODEL, num_threads: int = 8) -> List[List[int]]:
+    """Encode many texts at once; tiktoken releases the GIL and spreads them over threads."""
+    return get_encoding(model).encode_ordinary_batch(texts, num_threads=num_threads)
 
-def tokenize(text: str) -> List[int]:
-    return get_encoding().encode(text)
+@timed("tokens.count_batch")
+def count_tokens_batch(texts: List[str], model: str = MODEL, num_threads: int = 8) -> List[int]:
+    """Token counts for many texts, e.g. a whole history set or batch job."""
+    return [len(tokens) for tokens in encode_batch(texts, model, num_threads)]
 
 def num_tokens_from_messages(messages: List[Dict[str, Any]], model: str = MODEL) -> int:
     """Return the number of tokens used by a list of messages."""
     try:
-        encoding = get_encoding()
+        encoding = get_encoding(model)
         num_tokens = 0
         for message in messages:
             num_tokens += 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
@@ -25,4 +58,4 @@ def num_tokens_from_messages(messages: List[Dict[str, Any]], model: str = MODEL)
         num_tokens += 2  # every reply is primed with <im_start>assistant
         return num_tokens
     except Exception:
-        return 0  # Return 0 if there's an error in token counting
\ No newline at end of file
+        return 0  # Return 0 if there's an error in token counting
@@ -1,87 +1,204 @@
-import os
 import sys
 import subprocess
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
 import logging
-import tiktoken
-import asyncio
-import json
-from cli.src.tokenization import num_tokens_from_messages
-from agents import Runner
+import time
+from cli.src import tokenization
+from cli.src import cassette as cassettes
+from cli.src import metrics
+from cli.src import resilience
+from cli.src.agents_config import PLATFORM_BY_AGENT_NAME
+from cli.src.profiling import timed
+from cli.src.runtime import get_client
 
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Update OpenAI client initialization to use AsyncOpenAI
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# The AsyncOpenAI client is shared process-wide, see cli.src.runtime
 MODEL = "gpt-4o-mini"
 
+@timed("api.chat")
 async def get_chat_completion(messages, model='gpt-4o-mini'):
+    cassette = cassettes.active()
+    key = cassettes.chat_key(messages, model) if cassette else None
+    if cassette and cassette.replaying:
+        return (await cassette.replay(key))[0]
+
     logger.info(f"Calling OpenAI API with model: {model}")
+    started = time.perf_counter()
     try:
-        # Traditional OpenAI API approach
-        response = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0,
+        # Traditional OpenAI API approach, rate limited and retried per model
+        response = await resilience.call(
+            model,
+            lambda: get_client().chat.completions.create(model=model, messages=messages, temperature=0),
+            lambda: request_tokens(" ".join(str(m.get("content", "")) for m in messages), "", model),
+            used_tokens=lambda response: response.usage.total_tokens if response.usage else None,
         )
         logger.info("OpenAI API call completed successfully")
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+        metrics.observe_call(model, "chat", time.perf_counter() - started)
+        if cassette:
+            cassette.record("chat", key, model, str(messages[-1].get("content", "")), content, None,
+                            time.perf_counter() - started)
+        return content
     except Exception as e:
         logger.error(f"Error calling OpenAI API: {str(e)}")
+        metrics.observe_call(model, "chat", time.perf_counter() - started, error=type(e).__name__)
         raise
 
+def platform_of(agent):
+    """Platform an agent generates for (its name for agents built elsewhere)."""
+    return PLATFORM_BY_AGENT_NAME.get(agent.name, agent.name)
+
+def request_tokens(system_prompt, user_input, model="gpt-4o-mini"):
+    """Tokens a call is expected to use, for tokens-per-minute limits (~4 characters per token without tiktoken)."""
+    input_tokens = count_prompt_tokens(system_prompt, user_input, model) or (len(system_prompt) + len(user_input)) // 4
+    return input_tokens + resilience.EXPECTED_OUTPUT_TOKENS
+
+def agent_request_tokens(agent, user_input):
+    instructions = agent.instructions if isinstance(agent.instructions, str) else ""
+    return request_tokens(instructions, user_input, str(agent.model))
+
+def used_tokens(usage):
+    return usage["total_tokens"] if usage else None
+
+def usage_from_result(result):
+    """Extract the model-reported token usage from an Agents SDK run result, or None if absent."""
+    usage = getattr(getattr(result, "context_wrapper", None), "usage", None)
+    if usage is None or not (usage.input_tokens or usage.output_tokens):
+        return None
+    return {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "total_tokens": usage.total_tokens,
+        "requests": usage.requests
+    }
+
+@timed("api.agent")
 async def get_agent_completion(agent, user_input):
+    """Run an agent and return (final_output, usage); usage is None if the API reported none."""
+    cassette = cassettes.active()
+    key = cassettes.agent_key(agent, user_input) if cassette else None
+    if cassette and cassette.replaying:
+        return await cassette.replay(key)
+
+    from agents import Runner  # The Agents SDK is only loaded once a generation runs
+
     logger.info(f"Running agent: {agent.name}")
+    get_client()  # Make sure the shared client is installed as the Agents SDK default
+    started = time.perf_counter()
     try:
-        # Use the Runner from the Agents SDK to run the agent
-        result = await Runner.run(agent, input=user_input)
+        # Use the Runner from the Agents SDK to run the agent, rate limited and retried per model
+        result = await resilience.call(str(agent.model), lambda: Runner.run(agent, input=user_input),
+                                       lambda: agent_request_tokens(agent, user_input),
+                                       used_tokens=lambda result: used_tokens(usage_from_result(result)))
         logger.info("Agent run completed successfully")
-        return result.final_output
+        usage = usage_from_result(result)
+        metrics.observe_call(str(agent.model), platform_of(agent), time.perf_counter() - started)
+        if cassette:
+            cassette.record("agent", key, str(agent.model), user_input, result.final_output, usage,
+                            time.perf_counter() - started)
+        return result.final_output, usage
     except Exception as e:
         logger.error(f"Error running agent: {str(e)}")
+        metrics.observe_call(str(agent.model), platform_of(agent), time.perf_counter() - started,
+                             error=type(e).__name__)
+        raise
+
+@timed("api.agent_stream")
+async def stream_agent_completion(agent, user_input, on_delta):
+    """Run an agent with streaming, calling on_delta(text) per fragment; returns (final_output, usage)."""
+    cassette = cassettes.active()
+    key = cassettes.agent_key(agent, user_input) if cassette else None
+    if cassette and cassette.replaying:
+        return await cassette.replay(key, on_delta)
+
+    from agents import Runner
+    from openai.types.responses import ResponseTextDeltaEvent
+
+    logger.info(f"Streaming agent: {agent.name}")
+    get_client()  # Make sure the shared client is installed as the Agents SDK default
+    started = time.perf_counter()
+    first_token_at = None
+
+    async def run_stream():
+        nonlocal first_token_at
+        result = Runner.run_streamed(agent, input=user_input)
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                on_delta(event.data.delta)
+        return result
+
+    try:
+        # Retried only until the first token, so output already shown is never repeated
+        result = await resilience.call(str(agent.model), run_stream, lambda: agent_request_tokens(agent, user_input),
+                                       used_tokens=lambda result: used_tokens(usage_from_result(result)),
+                                       can_retry=lambda: first_token_at is None)
+        logger.info("Agent stream completed successfully")
+        usage = usage_from_result(result)
+        metrics.observe_call(str(agent.model), platform_of(agent), time.perf_counter() - started)
+        if cassette:
+            cassette.record("agent", key, str(agent.model), user_input, result.final_output, usage,
+                            time.perf_counter() - started,
+                            first_token_at - started if first_token_at is not None else None)
+        return result.final_output, usage
+    except Exception as e:
+        logger.error(f"Error streaming agent: {str(e)}")
+        metrics.observe_call(str(agent.model), platform_of(agent), time.perf_counter() - started,
+                             error=type(e).__name__)
         raise
 
 def count_tokens(text, model="gpt-4o-mini"):
-    """Count the number of tokens in a text string."""
+    """Count the number of tokens in a text string using the model's (cached) encoding."""
     try:
-        # GPT-4o Mini uses the same tokenizer as GPT-4
-        encoding = tiktoken.encoding_for_model("gpt-4o-mini")
-        return len(encoding.encode(text))
+        return tokenization.count_tokens(text, model)
     except Exception as e:
         logger.error(f"Error counting tokens: {str(e)}")
         return 0
 
-def calculate_prompt_price(input_tokens, output_tokens, model="gpt-4o-mini"):
-    """Calculate the price for a prompt based on token count."""
-    # Pricing rates for different models
-    prices = {
-        "gpt-4o-mini": {
-            "input": 0.15 / 1_000_000,  # $0.15 per 1M tokens
-            "output": 0.60 / 1_000_000,  # $0.60 per 1M tokens
-        },
-        "gpt-4o": {
-            "input": 5.00 / 1_000_000,  # $5.00 per 1M tokens
-            "output": 15.00 / 1_000_000,  # $15.00 per 1M tokens
-        },
-        "gpt-4.5-preview": {
-            "input": 75.00 / 1_000_000,  # $75.00 per 1M tokens
-            "output": 150.00 / 1_000_000,  # $150.00 per 1M tokens
-        },
-        "gpt-4.1-2025-04-14": {
-            "input": 3.00 / 1_000_000,  # $3.00 per 1M tokens
-            "output": 12.00 / 1_000_000,  # $12.00 per 1M tokens
-        }
+def count_prompt_tokens(system_prompt, question, model="gpt-4o-mini"):
+    """Count input tokens for a system prompt plus question; the system prompt count is memoized."""
+    try:
+        return tokenization.count_prompt_tokens(system_prompt, question, model)
+    except Exception as e:
+        logger.error(f"Error counting tokens: {str(e)}")
+        return 0
+
+# Pricing rates for different models
+MODEL_PRICES = {
+    "gpt-4o-mini": {
+        "input": 0.15 / 1_000_000,  # $0.15 per 1M tokens
+        "output": 0.60 / 1_000_000,  # $0.60 per 1M tokens
+    },
+    "gpt-4o": {
+        "input": 5.00 / 1_000_000,  # $5.00 per 1M tokens
+        "output": 15.00 / 1_000_000,  # $15.00 per 1M tokens
+    },
+    "gpt-4o-2024-11-20": {
+        "input": 2.50 / 1_000_000,  # $2.50 per 1M tokens
+        "output": 10.00 / 1_000_000,  # $10.00 per 1M tokens
+    },
+    "gpt-4.5-preview": {
+        "input": 75.00 / 1_000_000,  # $75.00 per 1M tokens
+        "output": 150.00 / 1_000_000,  # $150.00 per 1M tokens
+    },
+    "gpt-4.1-2025-04-14": {
+        "input": 3.00 / 1_000_000,  # $3.00 per 1M tokens
+        "output": 12.00 / 1_000_000,  # $12.00 per 1M tokens
     }
+}
 
-    if model not in prices:
+def calculate_prompt_price(input_tokens, output_tokens, model="gpt-4o-mini"):
+    """Calculate the price for a prompt based on token count."""
+    if model not in MODEL_PRICES:
         model = "gpt-4o-mini"  # default to GPT-4o Mini pricing
 
-    input_price = input_tokens * prices[model]["input"]
-    output_price = output_tokens * prices[model]["output"]
+    input_price = input_tokens * MODEL_PRICES[model]["input"]
+    output_price = output_tokens * MODEL_PRICES[model]["output"]
     total_price = input_price + output_price
 
     return {
@@ -92,6 +209,29 @@ def calculate_prompt_price(input_tokens, output_tokens, model="gpt-4o-mini"):
         "output_tokens": output_tokens
     }
 
+def completion_price_info(system_prompt, question, content, usage, model="gpt-4o-mini"):
+    """Price a completion from API-reported usage, falling back to local token counts."""
+    if usage:
+        price_info = calculate_prompt_price(usage["input_tokens"], usage["output_tokens"], model)
+        price_info["usage_source"] = "api"
+    else:
+        price_info = calculate_prompt_price(count_prompt_tokens(system_prompt, question, model),
+                                            count_tokens(content, model), model)
+        price_info["usage_source"] = "estimate"
+    return price_info
+
+def cached_price_info(price_info):
+    """Price info for a response served from the response cache (nothing is billed)."""
+    return {
+        **price_info,
+        "input_cost": 0.0,
+        "output_cost": 0.0,
+        "total_cost": 0.0,
+        "cached": True,
+        "saved_cost": price_info["total_cost"]
+    }
+
+@timed("clipboard")
 def copy_to_clipboard(console, text, show_success=True):
     """Helper function to copy text to clipboard with error handling."""
     try: